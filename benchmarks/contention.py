@@ -0,0 +1,110 @@
+"""
+Contenção entre leitores e merges: leituras com o lock do Node contra views imutáveis.
+
+Um nó sem peers recebe um documento inicial e depois uma thread escritora aplica
+inserts remotos sem parar, enquanto R threads leem o texto visível a cada
+--interval segundos (como uma tela sendo redesenhada; 0 = sem pausa). No modo
+"locked" cada leitura prende o lock do nó (como antes das views); no modo "view"
+usa Node.visible_text(), que lê uma cópia imutável da réplica. O relatório mostra
+merges/s e latência dos merges (p50/p95/máx) e leituras/s de cada modo.
+
+Uso:
+    python -m benchmarks.contention [--size 200000] [--readers 4] [--seconds 3] [--interval 0.005] [--columnar]
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.memory import remote_ops
+from benchmarks.suite import offline_node, percentiles
+
+WRITER_SITE = "9"
+
+
+def locked_read(node) -> str:
+    with node.lock:
+        return node.replica.visible_text()
+
+
+def view_read(node) -> str:
+    return node.visible_text()
+
+
+READS = {"locked": locked_read, "view": view_read}
+
+
+def run(
+    mode: str, size: int, readers: int, seconds: float, interval: float = 0.005, columnar: bool = False
+) -> dict:
+    node = offline_node("0", columnar=columnar)
+    try:
+        for op in remote_ops(size):
+            node.merge(op)
+        read = READS[mode]
+        stop = threading.Event()
+        reads = [0] * readers
+
+        def reader(i):
+            while not stop.is_set():
+                read(node)
+                reads[i] += 1
+                if interval:
+                    stop.wait(interval)
+
+        threads = [threading.Thread(target=reader, args=(i,), daemon=True) for i in range(readers)]
+        for t in threads:
+            t.start()
+
+        # a escritora continua o texto no fim, como alguém digitando
+        latencies = []
+        parent = node.replica.id_at(len(node.replica) - 1).serialize()
+        counter = 0
+        t0 = time.perf_counter()
+        deadline = t0 + seconds
+        while time.perf_counter() < deadline:
+            counter += 1
+            op_id = {"vclock": {WRITER_SITE: counter}, "site": WRITER_SITE, "lamport": size + counter}
+            op = {"type": "insert", "site_id": WRITER_SITE, "pos_id": parent, "char": "w", "op_id": op_id}
+            t = time.perf_counter()
+            node.merge(op)
+            latencies.append(time.perf_counter() - t)
+            parent = op_id
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        for t in threads:
+            t.join()
+        assert node.visible_text().endswith("w" * counter)
+
+        return {
+            "mode": mode,
+            "chars": size,
+            "readers": readers,
+            "interval": interval,
+            "columnar": columnar,
+            "merges": counter,
+            "merges_s": counter / elapsed,
+            "merge_latency_s": percentiles(latencies),
+            "reads_s": sum(reads) / elapsed,
+        }
+    finally:
+        node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--mode", choices=sorted(READS), action="append")
+    args = parser.parse_args()
+    results = [
+        run(m, args.size, args.readers, args.seconds, args.interval, args.columnar) for m in args.mode or ("locked", "view")
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Relatório de memória por caractere (tracemalloc) de uma réplica montada por merges remotos.
+
+Três sites digitam em blocos alternados, cada um continuando o texto do
+anterior; as operações são geradas e aplicadas uma a uma num nó sem peers, como
+se chegassem pela rede. O relatório mostra os bytes por caractere do nó inteiro
+(réplica e índices) e as linhas de código que mais alocaram.
+
+Uso:
+    python -m benchmarks.memory [--size 1000000] [--columnar] [--top 10]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmarks.suite import offline_node
+
+SITES = ("1", "2", "3")
+BLOCK = 50
+
+
+# Gera os inserts remotos: blocos de BLOCK caracteres por site, em rodízio
+def remote_ops(size: int):
+    clock = {s: 0 for s in SITES}
+    parent = None
+    for i in range(size):
+        site = SITES[(i // BLOCK) % len(SITES)]
+        clock[site] += 1
+        op_id = {"vclock": {site: clock[site]}, "site": site, "lamport": i + 1}
+        yield {"type": "insert", "site_id": site, "pos_id": parent, "char": chr(97 + i % 26), "op_id": op_id}
+        parent = op_id
+
+
+def measure(size: int, columnar: bool = False, top: int = 10) -> dict:
+    node = offline_node("0", columnar=columnar)
+    try:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        t0 = time.perf_counter()
+        for op in remote_ops(size):
+            node.merge(op)
+        seconds = time.perf_counter() - t0
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        assert node.replica.visible_count() == size
+
+        stats = after.compare_to(before, "lineno")
+        total = sum(s.size_diff for s in stats)
+        return {
+            "chars": size,
+            "columnar": columnar,
+            "build_seconds": seconds,
+            "bytes_total": total,
+            "bytes_per_char": total / size,
+            "top": [
+                {"where": str(s.traceback[0]), "bytes_per_char": s.size_diff / size}
+                for s in stats[:top]
+            ],
+        }
+    finally:
+        node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(measure(args.size, args.columnar, args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Replay de traces de operações (gravados com Node(trace=...) ou CRDT_TRACE) em nós novos.
+
+Cada operação do trace é aplicada via merge em todos os nós, na ordem dos
+timestamps; com vários arquivos, as entradas são intercaladas e as operações
+repetidas (vistas por mais de um nó) são aplicadas uma vez só.
+
+Uso:
+    python -m benchmarks.replay site_1.trace [site_2.trace ...] [--nodes 3] [--speed 1.0]
+
+--speed 0 (padrão) aplica o mais rápido possível; --speed 1.0 respeita os
+intervalos gravados, 2.0 reproduz no dobro da velocidade, etc.
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from benchmarks.suite import offline_node, percentiles, rate
+from optrace import read_trace
+
+
+def load_ops(paths: List[str]) -> List[dict]:
+    entries = [e for path in paths for e in read_trace(path)]
+    entries.sort(key=lambda e: e["t"])
+    seen = set()
+    out = []
+    for e in entries:
+        key = json.dumps([e["op"].get("type"), e["op"].get("op_id")], sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(e)
+    return out
+
+
+def replay(entries: List[dict], n_nodes: int = 1, speed: float = 0.0, columnar: bool = False) -> dict:
+    nodes = [offline_node(f"replay-{i + 1}", columnar=columnar) for i in range(n_nodes)]
+    latencies = []
+    try:
+        t_first = entries[0]["t"] if entries else 0.0
+        t0 = time.perf_counter()
+        for e in entries:
+            if speed > 0:
+                delay = (e["t"] - t_first) / speed - (time.perf_counter() - t0)
+                if delay > 0:
+                    time.sleep(delay)
+            op = e["op"]
+            for node in nodes:
+                start = time.perf_counter()
+                node.merge(op)
+                latencies.append(time.perf_counter() - start)
+        seconds = time.perf_counter() - t0
+        hashes = [n.state_hash() for n in nodes]
+        return {
+            "ops": len(entries),
+            "nodes": n_nodes,
+            "speed": speed,
+            "seconds": seconds,
+            "ops_s": rate(len(entries) * n_nodes, seconds),
+            "latency_s": percentiles(latencies),
+            "chars": nodes[0].replica.visible_count() if nodes else 0,
+            "state_hash": hashes[0] if hashes else None,
+            "converged": len(set(hashes)) <= 1,
+        }
+    finally:
+        for n in nodes:
+            n.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("traces", nargs="+")
+    parser.add_argument("--nodes", type=int, default=1)
+    parser.add_argument("--speed", type=float, default=0.0, help="0 = o mais rápido possível")
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--out", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    report = replay(load_ops(args.traces), args.nodes, args.speed, args.columnar)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
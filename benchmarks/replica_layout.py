@@ -0,0 +1,75 @@
+"""
+Compara os dois layouts de réplica (lista de Char x colunas paralelas) nas
+operações em bloco: texto visível, contagem de tombstones e snapshot.
+
+Uso:
+    python -m benchmarks.replica_layout [--size N] [--repeat K]
+"""
+import argparse
+import json
+import time
+
+from replica import ColumnarReplica, ListReplica
+from utils import Char, PositionID, VectorClock
+
+
+def build(replica_cls, size: int, delete_every: int = 10):
+    """
+    Monta uma réplica com `size` caracteres digitados em sequência por 3 sites,
+    marcando 1 a cada `delete_every` como deletado.
+    """
+    replica = replica_cls()
+    clock = VectorClock()
+    parent = None
+    for i in range(size):
+        site = str(i % 3 + 1)
+        clock.increment(site)
+        pid = PositionID(site, clock.v[site], i + 1)
+        replica.insert(i, Char(chr(97 + i % 26), pid, parent))
+        parent = pid
+    for i in range(0, size, delete_every):
+        replica.mark_deleted(replica.id_at(i), i)
+    return replica
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(size: int, repeat: int) -> dict:
+    results = {}
+    for name, cls in (("list", ListReplica), ("columnar", ColumnarReplica)):
+        t0 = time.perf_counter()
+        replica = build(cls, size)
+        build_s = time.perf_counter() - t0
+        results[name] = {
+            "build_s": build_s,
+            "visible_text_s": best_of(replica.visible_text, repeat),
+            "tombstones_s": best_of(replica.tombstones, repeat),
+            "snapshot_s": best_of(replica.snapshot, repeat),
+            "snapshot_json_s": best_of(lambda: json.dumps(replica.snapshot()), repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.size, args.repeat)
+    print(f"{'operação':<18}{'list (ms)':>12}{'columnar (ms)':>15}{'speedup':>10}")
+    for key in results["list"]:
+        a = results["list"][key] * 1000
+        b = results["columnar"][key] * 1000
+        print(f"{key:<18}{a:>12.2f}{b:>15.2f}{a / b if b else float('inf'):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Suíte de benchmarks do CRDT e da rede, com resultado em JSON para comparar commits.
+
+Cargas:
+  local_ops      insert/delete locais (índice visível e cursor) por tamanho de documento
+  remote_merge   merge de operações remotas num nó vazio
+  siblings       inserts concorrentes no mesmo ponto (ordenação de irmãos)
+  bootstrap      tempo até um nó novo ficar pronto via snapshot em streaming
+  convergence    latência fim a fim até todos os nós (localhost) verem uma edição
+  replica_layout operações em bloco nos layouts lista x colunar
+
+Uso:
+    python -m benchmarks.suite [--quick] [--only local_ops,siblings] [--out r.json]
+    python -m benchmarks.suite --compare antes.json depois.json
+"""
+import argparse
+import json
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import replica_layout
+from node import Node
+
+SEED = 1234
+
+
+def free_ports(n: int):
+    socks = []
+    for _ in range(n):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("127.0.0.1", 0))
+        socks.append(s)
+    ports = [s.getsockname()[1] for s in socks]
+    for s in socks:
+        s.close()
+    return ports
+
+
+def offline_node(site_id: str, **kwargs) -> Node:
+    """
+    Nó sem peers e sem exportar arquivo: mede só o caminho do CRDT.
+    """
+    return Node(site_id, "127.0.0.1", free_ports(1)[0], [], export=False, **kwargs)
+
+
+def prefill(node: Node, size: int):
+    node.cursor().insert("".join(chr(97 + i % 26) for i in range(size)))
+
+
+def rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {"p50": pick(0.5), "p95": pick(0.95), "max": samples[-1], "mean": statistics.fmean(samples)}
+
+
+def bench_local_ops(sizes, ops: int) -> dict:
+    rng = random.Random(SEED)
+    out = {}
+    for size in sizes:
+        node = offline_node("1")
+        try:
+            prefill(node, size)
+
+            t0 = time.perf_counter()
+            for _ in range(ops):
+                node.insert("x", rng.randint(0, size))
+            insert_s = time.perf_counter() - t0
+
+            cur = node.cursor(size // 2)
+            t0 = time.perf_counter()
+            for _ in range(ops):
+                cur.insert("y")
+            cursor_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for _ in range(ops):
+                node.delete(rng.randrange(node.replica.visible_count()))
+            delete_s = time.perf_counter() - t0
+        finally:
+            node.stop()
+        out[str(size)] = {
+            "insert_index_ops_s": rate(ops, insert_s),
+            "insert_cursor_ops_s": rate(ops, cursor_s),
+            "delete_index_ops_s": rate(ops, delete_s),
+        }
+    return out
+
+
+def capture_ops(node: Node):
+    ops = []
+    node._broadcast = ops.append
+    return ops
+
+
+def bench_remote_merge(size: int) -> dict:
+    rng = random.Random(SEED)
+    src = offline_node("1")
+    dst = offline_node("2")
+    try:
+        ops = capture_ops(src)
+        prefill(src, size)
+        for _ in range(size // 10):
+            src.delete(rng.randrange(src.replica.visible_count()))
+
+        t0 = time.perf_counter()
+        for op in ops:
+            dst.merge(op)
+        seconds = time.perf_counter() - t0
+        assert dst.visible_text() == src.visible_text()
+    finally:
+        src.stop()
+        dst.stop()
+    return {"ops": len(ops), "seconds": seconds, "ops_s": rate(len(ops), seconds)}
+
+
+def bench_siblings(sites: int, per_site: int) -> dict:
+    """
+    Cada site insere `per_site` caracteres no início, sem ver os outros; as
+    operações chegam embaralhadas em duas ordens diferentes.
+    """
+    ops = []
+    for i in range(sites):
+        node = offline_node(str(i + 1))
+        try:
+            captured = capture_ops(node)
+            for j in range(per_site):
+                node.insert(chr(65 + j % 26), 0)
+            ops.extend(captured)
+        finally:
+            node.stop()
+
+    texts = []
+    seconds = []
+    for order_seed in (1, 2):
+        order = list(ops)
+        random.Random(order_seed).shuffle(order)
+        node = offline_node("0")
+        try:
+            t0 = time.perf_counter()
+            for op in order:
+                node.merge(op)
+            seconds.append(time.perf_counter() - t0)
+            texts.append(node.visible_text())
+        finally:
+            node.stop()
+    return {
+        "ops": len(ops),
+        "ops_s": rate(len(ops), max(seconds)),
+        "converged": texts[0] == texts[1],
+    }
+
+
+def bench_bootstrap(size: int) -> dict:
+    port_a, port_b = free_ports(2)
+    a = Node("1", "127.0.0.1", port_a, [], export=False)
+    b = None
+    try:
+        prefill(a, size)
+        t0 = time.perf_counter()
+        b = Node("2", "127.0.0.1", port_b, [("127.0.0.1", port_a)], export=False)
+        while b.join["ready_at"] is None and time.perf_counter() - t0 < 120:
+            time.sleep(0.005)
+        seconds = time.perf_counter() - t0
+        assert b.visible_text() == a.visible_text()
+        return {"chars": size, "seconds": seconds, "bytes": sum(b.join["bytes"].values())}
+    finally:
+        a.stop()
+        if b is not None:
+            b.stop()
+
+
+def bench_convergence(n_nodes: int, edits: int) -> dict:
+    ports = free_ports(n_nodes)
+    addrs = [("127.0.0.1", p) for p in ports]
+    nodes = [
+        Node(str(i + 1), "127.0.0.1", ports[i], [a for a in addrs if a[1] != ports[i]], export=False)
+        for i in range(n_nodes)
+    ]
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline and not all(
+            len(n.peer_sockets) == n_nodes - 1 and n.join["ready_at"] is not None for n in nodes
+        ):
+            time.sleep(0.05)
+
+        cursors = [n.cursor() for n in nodes]
+        latencies = []
+        for k in range(edits):
+            i = k % n_nodes
+            expected = nodes[i].replica.visible_count() + 1
+            t0 = time.perf_counter()
+            cursors[i].insert("z")
+            while any(n.replica.visible_count() < expected for n in nodes):
+                if time.perf_counter() - t0 > 10:
+                    break
+                time.sleep(0.0002)
+            latencies.append(time.perf_counter() - t0)
+            # próximas edições continuam no fim do texto
+            for j, n in enumerate(nodes):
+                cursors[j] = n.cursor()
+        texts = {n.visible_text() for n in nodes}
+        return {"nodes": n_nodes, "edits": edits, "latency_s": percentiles(latencies), "converged": len(texts) == 1}
+    finally:
+        for n in nodes:
+            n.stop()
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": SEED,
+    }
+
+
+def run(quick: bool, only=None) -> dict:
+    scale = 1 if quick else 5
+    workloads = {
+        "local_ops": lambda: bench_local_ops([1_000, 10_000] if quick else [1_000, 10_000, 50_000], 200 * scale),
+        "remote_merge": lambda: bench_remote_merge(2_000 * scale),
+        "siblings": lambda: bench_siblings(5, 40 * scale),
+        "bootstrap": lambda: bench_bootstrap(5_000 * scale),
+        "convergence": lambda: bench_convergence(3 if quick else 5, 20 * scale),
+        "replica_layout": lambda: replica_layout.run(10_000 * scale, 3),
+    }
+    results = {}
+    for name, fn in workloads.items():
+        if only and name not in only:
+            continue
+        print(f"[bench] {name}...", file=sys.stderr)
+        results[name] = fn()
+    return {"meta": metadata(), "results": results}
+
+
+def flatten(d: dict, prefix: str = ""):
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            yield from flatten(v, key)
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield key, v
+
+
+# Compara dois resultados: razão depois/antes para cada métrica numérica
+def compare(before: dict, after: dict):
+    a = dict(flatten(before["results"]))
+    b = dict(flatten(after["results"]))
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    for key in sorted(a.keys() & b.keys()):
+        ratio = b[key] / a[key] if a[key] else float("inf")
+        print(f"{key:<60}{a[key]:>14.4g}{b[key]:>14.4g}{ratio:>9.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="tamanhos reduzidos")
+    parser.add_argument("--only", help="cargas separadas por vírgula")
+    parser.add_argument("--out", help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f1, open(args.compare[1]) as f2:
+            compare(json.load(f1), json.load(f2))
+        return
+
+    report = run(args.quick, set(args.only.split(",")) if args.only else None)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
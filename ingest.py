@@ -0,0 +1,218 @@
+import difflib
+import os
+import threading
+import traceback
+from typing import List, Optional, Tuple
+
+from utils import PositionID
+
+# Trechos até este tamanho (somando os dois lados) são comparados caractere a
+# caractere; acima disso o diff é feito por linhas e só os blocos de linhas
+# alterados pequenos o bastante são refinados por caractere.
+CHAR_DIFF_LIMIT = 20_000
+# Bloco usado para achar prefixo/sufixo comuns (comparação de fatias, em C)
+BLOCK = 4096
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _common_prefix(a, b) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i + BLOCK <= n and a[i : i + BLOCK] == b[i : i + BLOCK]:
+        i += BLOCK
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _common_suffix(a, b, limit: int) -> int:
+    n = min(len(a), len(b)) - limit
+    i = 0
+    la, lb = len(a), len(b)
+    while i + BLOCK <= n and a[la - i - BLOCK : la - i] == b[lb - i - BLOCK : lb - i]:
+        i += BLOCK
+    while i < n and a[la - i - 1] == b[lb - i - 1]:
+        i += 1
+    return i
+
+
+# Diff de `a` para `b` no formato dos opcodes do difflib, sem os trechos iguais
+def diff(a: str, b: str) -> List[Opcode]:
+    p = _common_prefix(a, b)
+    s = _common_suffix(a, b, p)
+    return _diff_middle(a[p : len(a) - s], b[p : len(b) - s], p, p)
+
+
+def _diff_middle(a: str, b: str, ai: int, bi: int) -> List[Opcode]:
+    if not a and not b:
+        return []
+    if not a:
+        return [("insert", ai, ai, bi, bi + len(b))]
+    if not b:
+        return [("delete", ai, ai + len(a), bi, bi)]
+    if len(a) + len(b) <= CHAR_DIFF_LIMIT:
+        sm = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        return [(tag, ai + i1, ai + i2, bi + j1, bi + j2) for tag, i1, i2, j1, j2 in sm.get_opcodes() if tag != "equal"]
+
+    a_lines = a.splitlines(keepends=True)
+    b_lines = b.splitlines(keepends=True)
+    a_off = _offsets(a_lines)
+    b_off = _offsets(b_lines)
+    out = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a_lines, b_lines).get_opcodes():
+        if tag == "equal":
+            continue
+        x1, x2, y1, y2 = a_off[i1], a_off[i2], b_off[j1], b_off[j2]
+        if tag == "replace" and (x2 - x1) + (y2 - y1) <= CHAR_DIFF_LIMIT:
+            out.extend(_diff_middle(a[x1:x2], b[y1:y2], ai + x1, bi + y1))
+        else:
+            out.append((tag, ai + x1, ai + x2, bi + y1, bi + y2))
+    return out
+
+
+def _offsets(lines: List[str]) -> List[int]:
+    offs = [0]
+    for line in lines:
+        offs.append(offs[-1] + len(line))
+    return offs
+
+
+# Aplica `new_text` como o menor conjunto de runs de insert e faixas deletadas,
+# calculados contra a versão base (IDs e texto visíveis de quando o conteúdo
+# foi lido/exportado). Como as operações são ancoradas nos IDs da base, edições
+# remotas feitas depois dela são preservadas. Sem base, usa o texto atual.
+def apply_text(
+    node,
+    new_text: str,
+    base_ids: Optional[List[PositionID]] = None,
+    base_text: Optional[str] = None,
+) -> dict:
+    return apply_diff(node, new_text, base_ids, base_text)[0]
+
+
+# Como apply_text, mas devolve também os IDs dos caracteres de `new_text` (a base
+# para o próximo diff do mesmo conteúdo)
+def apply_diff(
+    node,
+    new_text: str,
+    base_ids: Optional[List[PositionID]] = None,
+    base_text: Optional[str] = None,
+) -> Tuple[dict, List[PositionID]]:
+    stats = {"inserts": 0, "chars_inserted": 0, "deletes": 0, "chars_deleted": 0}
+    with node.lock:
+        if base_ids is None:
+            base_ids = node.replica.visible_ids()
+            base_text = node.replica.visible_text()
+        opcodes = diff(base_text, new_text)
+        if not opcodes:
+            return stats, list(base_ids)
+        new_ids: List[PositionID] = []
+        pos = 0
+        # um único export no final, em vez de um por caractere
+        export, node.export = node.export, False
+        try:
+            for tag, i1, i2, j1, j2 in opcodes:
+                new_ids.extend(base_ids[pos:i1])
+                pos = i2
+                if tag in ("delete", "replace"):
+                    node.delete_ids(base_ids[i1:i2])
+                    stats["deletes"] += 1
+                    stats["chars_deleted"] += i2 - i1
+                if tag in ("insert", "replace"):
+                    anchor = base_ids[i1 - 1] if i1 > 0 else None
+                    new_ids.extend(node.insert_after(anchor, new_text[j1:j2]))
+                    stats["inserts"] += 1
+                    stats["chars_inserted"] += j2 - j1
+            new_ids.extend(base_ids[pos:])
+        finally:
+            node.export = export
+        if export:
+            node.export_to_file()
+    return stats, new_ids
+
+
+# Acompanha um arquivo e ingere edições externas no Node. O polling só olha
+# mtime e tamanho; o conteúdo é lido apenas quando um deles muda. As escritas
+# do próprio nó (export_to_file) são reconhecidas e viram a nova base.
+class FileWatcher:
+    def __init__(self, node, path: str, interval: float = 0.5):
+        self.node = node
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.ingested = 0
+        # (mtime_ns, tamanho) do último estado do arquivo já tratado
+        self._seen: Optional[Tuple[int, int]] = None
+        self._last_bytes = b""
+        self._exported = False
+        # base do diff: IDs e texto visíveis que correspondem ao conteúdo do arquivo
+        with node.lock:
+            self._base_ids = node.replica.visible_ids()
+            self._base_text = node.replica.visible_text()
+            self._last_bytes = self._base_text.encode("utf-8")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+
+    @staticmethod
+    def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    # Verdadeiro se `path` é o arquivo observado e ele mudou desde o último estado
+    # tratado (ex: o usuário salvou e o polling ainda não passou)
+    def changed_on_disk(self, path: str) -> bool:
+        if os.path.abspath(path) != self.path:
+            return False
+        key = self._stat_key(self.path)
+        return key is not None and key != self._seen
+
+    # Chamado pelo Node (sob o lock) depois de gravar o arquivo exportado
+    def note_export(self, path: str, text: str, ids: List[PositionID]):
+        if os.path.abspath(path) != self.path:
+            return
+        self._seen = self._stat_key(self.path)
+        self._exported = True
+        self._base_ids = ids
+        self._base_text = text
+        self._last_bytes = text.encode("utf-8")
+
+    # Verifica o arquivo uma vez; devolve as estatísticas do ingest ou None
+    def poll(self) -> Optional[dict]:
+        key = self._stat_key(self.path)
+        if key is None or key == self._seen:
+            return None
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with self.node.lock:
+            self._seen = key
+            # mudou só o mtime, ou o arquivo lido é o que o próprio nó acabou de exportar
+            # (a região alterada é achada depois, pelo diff, com prefixo/sufixo em blocos)
+            if data == self._last_bytes:
+                return None
+            self._exported = False
+            stats, ids = apply_diff(self.node, data.decode("utf-8"), self._base_ids, self._base_text)
+            if not self._exported:
+                # a base passa a ser o conteúdo do arquivo; edições remotas que ele
+                # não tem continuam fora da base e por isso não são apagadas depois
+                self._base_ids = ids
+                self._base_text = data.decode("utf-8")
+                self._last_bytes = data
+            self.ingested += 1
+        return stats
@@ -1,6 +1,16 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from metrics import Metrics
 from node import Node
+from optrace import TraceWriter
 
-# Configuração fixa dos nós.
+# Configuração padrão dos nós (pode ser trocada por --config).
 NODES_CONFIG = {
     "1": {
         "host": "127.0.0.1",
@@ -20,8 +30,98 @@ NODES_CONFIG = {
 }
 
 
+COMMANDS = (
+    "Commands: insert <index> <char>, delete <index>, show, peers, stats, "
+    "profile start|stop|dump [arquivo], memprofile [stop|arquivo], "
+    "load <arquivo>, watch [arquivo] [intervalo], unwatch, sleep <segundos>, quit"
+)
+
+
+# Executa um comando do CLI; devolve False no quit. Com verbose=False (scripts),
+# insert/delete não imprimem o texto inteiro a cada operação.
+def run_command(node: Node, line: str, verbose: bool = True) -> bool:
+    parts = line.split()
+    cmd = parts[0].lower()
+    if cmd == "insert":
+        if len(parts) < 3:
+            print("usage: insert <index> <char>")
+            return True
+        idx = int(parts[1])
+        ch = " ".join(parts[2:])
+        node.insert(ch, idx)
+        if verbose:
+            print("after insert, visible:", node.visible_text())
+    elif cmd == "delete":
+        if len(parts) != 2:
+            print("usage: delete <index>")
+            return True
+        idx = int(parts[1])
+        node.delete(idx)
+        if verbose:
+            print("after delete, visible:", node.visible_text())
+    elif cmd == "show":
+        print("Visible text:", node.visible_text())
+        print("Full replica (including deleted):")
+        node.show_full()
+    elif cmd == "peers":
+        print("Peer sockets:", list(node.peer_sockets.keys()))
+        print("Join:", node.join_stats())
+    elif cmd == "stats":
+        if node.metrics is None:
+            print("metrics disabled (defina CRDT_METRICS=1)")
+        else:
+            print(json.dumps(node.metrics.snapshot(), indent=2))
+    elif cmd == "profile":
+        sub = parts[1].lower() if len(parts) > 1 else ""
+        if sub == "start":
+            node.profile_start()
+            print("profiling ligado (merge e threads de rede)")
+        elif sub == "stop":
+            node.profile_stop()
+            print("profiling desligado")
+        elif sub == "dump":
+            path, summary = node.profile_dump(parts[2] if len(parts) > 2 else None)
+            print(summary)
+            if path:
+                print(f"perfil gravado em {path} (python -m pstats {path})")
+        else:
+            print("usage: profile start|stop|dump [arquivo]")
+    elif cmd == "memprofile":
+        if len(parts) > 1 and parts[1].lower() == "stop":
+            node.memprofile_stop()
+            print("tracemalloc desligado")
+            return True
+        path, summary = node.memprofile(parts[1] if len(parts) > 1 else None)
+        print(summary)
+        if path:
+            print(f"snapshot gravado em {path}")
+    elif cmd == "load":
+        if len(parts) != 2:
+            print("usage: load <arquivo>")
+            return True
+        try:
+            print("ingest:", node.load_file(parts[1]))
+        except OSError as e:
+            print(f"erro ao ler {parts[1]}: {e}")
+    elif cmd == "watch":
+        path = parts[1] if len(parts) > 1 else None
+        interval = float(parts[2]) if len(parts) > 2 else 0.5
+        watcher = node.watch(path, interval)
+        print(f"observando {watcher.path} a cada {interval}s")
+    elif cmd == "unwatch":
+        node.unwatch()
+        print("observação desligada")
+    elif cmd == "sleep":
+        time.sleep(float(parts[1]) if len(parts) > 1 else 1.0)
+    elif cmd == "quit":
+        return False
+    else:
+        print("unknown cmd")
+    return True
+
+
 def repl(node: Node):
-    print("Commands: insert <index> <char>, delete <index>, show, peers, quit")
+    print(COMMANDS)
     while True:
         try:
             line = input("> ").strip()
@@ -29,55 +129,261 @@ def repl(node: Node):
             break
         if not line:
             continue
-        parts = line.split()
-        cmd = parts[0].lower()
-        if cmd == "insert":
-            if len(parts) < 3:
-                print("usage: insert <index> <char>")
-                continue
-            idx = int(parts[1])
-            ch = " ".join(parts[2:])
-            node.insert(ch, idx)
-            print("after insert, visible:", node.visible_text())
-        elif cmd == "delete":
-            if len(parts) != 2:
-                print("usage: delete <index>")
-                continue
-            idx = int(parts[1])
-            node.delete(idx)
-            print("after delete, visible:", node.visible_text())
-        elif cmd == "show":
-            print("Visible text:", node.visible_text())
-            print("Full replica (including deleted):")
-            node.show_full()
-        elif cmd == "peers":
-            print("Peer sockets:", list(node.peer_sockets.keys()))
-        elif cmd == "quit":
+        if not run_command(node, line):
             node.stop()
             break
+
+
+# Modo headless (sem prompt): para testes de carga e soak automatizados.
+# Os comandos vêm de um script ou do stdin, e/ou de uma carga sintética; na
+# saída é impresso um resumo em JSON com vazão e estado da réplica.
+
+WORKLOADS = ("random", "sequential")
+ALPHABET = "abcdefghijklmnopqrstuvwxyz "
+
+
+def parse_addr(addr) -> Tuple[str, int]:
+    if isinstance(addr, str):
+        host, _, port = addr.rpartition(":")
+        return host or "127.0.0.1", int(port)
+    host, port = addr
+    return host, int(port)
+
+
+# Topologia: --config (JSON no formato de NODES_CONFIG) ou NODES_CONFIG, com
+# --host/--port/--peer sobrescrevendo o que vier dele
+def resolve_config(args) -> Tuple[str, str, int, List[Tuple[str, int]]]:
+    nodes = NODES_CONFIG
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            nodes = json.load(f)
+    cfg = nodes.get(args.site, {})
+    if not cfg and args.port is None:
+        raise SystemExit(f"Site ID {args.site} não está na configuração (use --port/--peer)")
+    host = args.host or cfg.get("host", "127.0.0.1")
+    port = args.port if args.port is not None else int(cfg["port"])
+    peers = [parse_addr(p) for p in (args.peer if args.peer is not None else cfg.get("peers", []))]
+    return args.site, host, port, peers
+
+
+# Executa os comandos de um script (ou do stdin com "-"), sem pausa entre eles.
+# Devolve (operações de edição executadas, latências, erros).
+def run_script(node: Node, path: str):
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    ops, latencies, errors = 0, [], 0
+    try:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            edit = line.split()[0].lower() in ("insert", "delete")
+            t0 = time.perf_counter()
+            try:
+                if not run_command(node, line, verbose=False):
+                    break
+            except Exception as e:
+                errors += 1
+                print(f"[script] erro em {line!r}: {e}", file=sys.stderr)
+                continue
+            if edit:
+                ops += 1
+                latencies.append(time.perf_counter() - t0)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return ops, latencies, errors
+
+
+# Carga sintética: "sequential" digita no fim do texto (com quebras de linha);
+# "random" insere e deleta (20%) em posições aleatórias. rate = operações por
+# segundo (0 = o mais rápido possível).
+def run_workload(node: Node, kind: str, ops: int, rate: float = 0.0, seed: int = 0):
+    rng = random.Random(f"{seed}-{node.site_id}")
+    cursor = node.cursor()
+    latencies = []
+    start = time.perf_counter()
+    for i in range(ops):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        if kind == "sequential":
+            cursor.insert("\n" if i % 60 == 59 else rng.choice(ALPHABET))
         else:
-            print("unknown cmd")
+            size = node.view().visible_count()
+            if size and rng.random() < 0.2:
+                node.delete(rng.randrange(size))
+            else:
+                node.insert(rng.choice(ALPHABET), rng.randint(0, size))
+        latencies.append(time.perf_counter() - t0)
+    return ops, latencies
 
 
-if __name__ == "__main__":
-    print("=== Collaborative Text Editor (CRDT) ===")
-    print("Nós disponíveis: 1, 2, 3")
-    site_id = input("Digite o site ID (1, 2 ou 3): ").strip()
+def wait_peers(node: Node, count: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while len(node.peer_sockets) < count:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+# Espera a réplica ficar parada (nenhuma operação nova aplicada) por `settle`
+# segundos, até `timeout`. Devolve True se parou.
+def wait_quiescent(node: Node, settle: float, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    last, since = node._version, time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(min(0.05, settle))
+        if node._version != last:
+            last, since = node._version, time.monotonic()
+        elif time.monotonic() - since >= settle:
+            return True
+    return False
+
+
+# Espera os `expected` peers terminarem de editar e anunciarem o mesmo relógio
+# `applied` deste nó (ver Node.send_status), até `timeout`. O status é reenviado
+# a cada volta e uma última vez no fim, para os peers também verem a igualdade.
+def wait_converged(node: Node, expected: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while True:
+        node.send_status(done=True)
+        if len(node.converged_peers()) >= expected:
+            node.send_status(done=True)
+            return True
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.1)
+
 
-    if site_id not in NODES_CONFIG:
-        print(f"Site ID inválido: {site_id}")
-        exit(1)
+def summarize(
+    node: Node, ops: int, seconds: float, latencies: List[float], errors: int, settled: bool, converged: bool
+) -> dict:
+    view = node.view()
+    with node.lock:
+        applied = dict(node.applied)
+        pending = sum(len(v) for v in node.pending_inserts.values())
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+    return {
+        "site": node.site_id,
+        "ops": ops,
+        "errors": errors,
+        "seconds": seconds,
+        "ops_s": ops / seconds if seconds else 0.0,
+        "op_latency_s": {"p50": pick(0.5), "p95": pick(0.95), "max": latencies[-1] if latencies else 0.0},
+        "chars": view.visible_count(),
+        "tombstones": view.tombstones(),
+        "peers_connected": sorted(node.peer_sockets),
+        "peers_converged": node.converged_peers(),
+        "applied": applied,
+        "pending_inserts": pending,
+        # local: nenhuma operação nova por --settle segundos e nada pendente
+        "settled": settled and pending == 0,
+        # todos os peers configurados terminaram e aplicaram as mesmas operações
+        "converged": converged and pending == 0,
+        "state_hash": node.state_hash(),
+        "join": node.join_stats(),
+    }
 
-    cfg = NODES_CONFIG[site_id]
-    host = cfg["host"]
-    port = cfg["port"]
-    peers = cfg["peers"]
 
-    print(f"Iniciando nó {site_id} em {host}:{port}")
-    print(f"Peers: {peers}")
+def run_headless(node: Node, args, expected_peers: int) -> dict:
+    if args.wait_peers and not wait_peers(node, args.wait_peers, args.timeout):
+        print(f"[headless] só {len(node.peer_sockets)} de {args.wait_peers} peers conectados", file=sys.stderr)
+    ops, latencies, errors = 0, [], 0
+    t0 = time.perf_counter()
+    if args.script:
+        ops, latencies, errors = run_script(node, args.script)
+    if args.workload:
+        n, lat = run_workload(node, args.workload, args.ops, args.rate, args.seed)
+        ops += n
+        latencies += lat
+    seconds = time.perf_counter() - t0
+    converged = wait_converged(node, expected_peers, args.timeout)
+    settled = wait_quiescent(node, args.settle, args.timeout)
+    return summarize(node, ops, seconds, latencies, errors, settled, converged)
 
-    node = Node(site_id, host, port, peers)
+
+def build_metrics() -> Optional[Metrics]:
+    # Métricas opcionais: CRDT_METRICS=1 liga os contadores e CRDT_METRICS_PORT
+    # expõe /metrics (Prometheus) e /stats (JSON) em 127.0.0.1
+    metrics = None
+    if os.environ.get("CRDT_METRICS") or os.environ.get("CRDT_METRICS_PORT"):
+        metrics = Metrics()
+        if os.environ.get("CRDT_METRICS_PORT"):
+            addr = metrics.serve("127.0.0.1", int(os.environ["CRDT_METRICS_PORT"]))
+            print(f"Métricas em http://{addr[0]}:{addr[1]}/metrics", file=sys.stderr)
+    return metrics
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Editor de texto colaborativo (CRDT)")
+    parser.add_argument("--site", help="site ID (sem ele, pergunta interativamente)")
+    parser.add_argument("--config", help="JSON com a topologia, no formato de NODES_CONFIG")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--peer", action="append", help="host:porta (repetível; substitui os peers da config)")
+    parser.add_argument("--columnar", action="store_true", help="réplica colunar")
+    parser.add_argument("--no-export", action="store_true", help="não grava site_<id>.txt")
+    parser.add_argument("--script", help="arquivo de comandos do CLI ('-' = stdin); liga o modo headless")
+    parser.add_argument("--workload", choices=WORKLOADS, help="carga sintética; liga o modo headless")
+    parser.add_argument("--ops", type=int, default=1000, help="operações da carga sintética")
+    parser.add_argument("--rate", type=float, default=0.0, help="operações/s da carga (0 = sem limite)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--wait-peers", type=int, default=0, help="espera N peers conectados antes de começar")
+    parser.add_argument("--settle", type=float, default=1.0, help="segundos sem operações novas para encerrar")
+    parser.add_argument("--timeout", type=float, default=30.0, help="limite para esperar peers e o settle")
+    parser.add_argument("--summary", help="grava o resumo JSON também neste arquivo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    headless = bool(args.script or args.workload)
+    if args.site is None:
+        if headless:
+            raise SystemExit("--site é obrigatório no modo headless")
+        print("=== Collaborative Text Editor (CRDT) ===")
+        print("Nós disponíveis: 1, 2, 3")
+        args.site = input("Digite o site ID (1, 2 ou 3): ").strip()
+        if args.site not in NODES_CONFIG:
+            print(f"Site ID inválido: {args.site}")
+            exit(1)
+
+    site_id, host, port, peers = resolve_config(args)
+    # no modo headless as mensagens de início vão para o stderr
+    log = sys.stderr if headless else sys.stdout
+    print(f"Iniciando nó {site_id} em {host}:{port}", file=log)
+    print(f"Peers: {peers}", file=log)
+
+    metrics = build_metrics()
+    # CRDT_TRACE=<arquivo> grava as operações locais e recebidas (ver benchmarks/replay.py)
+    trace = None
+    if os.environ.get("CRDT_TRACE"):
+        trace = TraceWriter(os.environ["CRDT_TRACE"])
+        print(f"Gravando operações em {trace.path}", file=log)
+
+    node = Node(
+        site_id, host, port, peers, columnar=args.columnar, metrics=metrics, export=not args.no_export, trace=trace
+    )
     try:
-        repl(node)
+        if not headless:
+            repl(node)
+            return
+        summary = run_headless(node, args, len(peers))
+        print(json.dumps(summary, indent=2))
+        if args.summary:
+            with open(args.summary, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        if not summary["converged"]:
+            exit(2)
     finally:
         node.stop()
+        if metrics is not None:
+            metrics.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    # Quantil aproximado: limite superior do bucket onde o quantil cai
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+# Lock que mede o tempo de espera para adquirir o lock original do Node
+class TimedLock:
+    def __init__(self, lock, metrics: "Metrics"):
+        self._lock = lock
+        self._metrics = metrics
+
+    def acquire(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        ok = self._lock.acquire(*args, **kwargs)
+        self._metrics.observe("lock_wait_seconds", time.perf_counter() - t0)
+        return ok
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# Contadores e histogramas de um Node. Só existe custo quando um Metrics é passado
+# ao Node: instrument() troca os métodos quentes da instância por versões medidas,
+# e os poucos pontos de I/O checam `node.metrics is not None`.
+class Metrics:
+    def __init__(self):
+        self._mutex = threading.Lock()
+        # (nome, rótulos no formato Prometheus) -> valor
+        self.counters: Dict[Tuple[str, str], float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.node = None
+        self.started = time.time()
+        self._connected_once = set()
+        # profundidade de chamadas medidas por thread (ver _wrap)
+        self._depth = threading.local()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def inc(self, name: str, value: float = 1, labels: str = ""):
+        key = (name, labels)
+        with self._mutex:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        with self._mutex:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    # Eventos de rede chamados pelo Node
+    def on_bytes_sent(self, peer: str, n: int):
+        self.inc("bytes_sent_total", n, f'peer="{peer}"')
+
+    def on_bytes_received(self, peer: str, n: int):
+        self.inc("bytes_received_total", n, f'peer="{peer}"')
+
+    def on_connect(self, peer: str):
+        self.inc("peer_connects_total", 1, f'peer="{peer}"')
+        if peer in self._connected_once:
+            self.inc("peer_reconnects_total", 1, f'peer="{peer}"')
+        self._connected_once.add(peer)
+
+    def instrument(self, node):
+        self.node = node
+        node.lock = TimedLock(node.lock, self)
+        self._wrap(node, "merge", "merge_seconds", "ops_merged_total")
+        self._wrap(node, "_merge_insert", "merge_insert_seconds", "ops_applied_total", 'type="insert"', applied=True)
+        self._wrap(node, "_merge_delete", "merge_delete_seconds", "ops_applied_total", 'type="delete"', applied=True)
+        self._wrap(node, "_broadcast", "broadcast_seconds", "broadcasts_total")
+        self._wrap(node, "_process_incoming", "incoming_seconds", "messages_received_total")
+
+    # Com applied=True, o contador só sobe quando o método devolve True (operação
+    # de fato aplicada, não duplicada nem pendente). Chamadas recursivas (ex: filhos
+    # pendentes aplicados dentro de _merge_insert) contam, mas só a mais externa
+    # entra no histograma, para o tempo não ser somado duas vezes.
+    def _wrap(self, node, method: str, hist: str, counter: str, labels: str = "", applied: bool = False):
+        fn = getattr(node, method)
+        depth = self._depth
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            level = getattr(depth, method, 0)
+            setattr(depth, method, level + 1)
+            t0 = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                setattr(depth, method, level)
+                if not level:
+                    self.observe(hist, time.perf_counter() - t0)
+                if result or not applied:
+                    self.inc(counter, 1, labels)
+
+        setattr(node, method, timed)
+
+    # Valores instantâneos lidos do Node no momento da coleta
+    def gauges(self) -> Dict[str, float]:
+        node = self.node
+        if node is None:
+            return {}
+        view = node.view()
+        size = len(view)
+        tombstones = view.tombstones()
+        with node.lock:
+            pending = sum(len(v) for v in node.pending_inserts.values())
+        join = node.join_stats()
+        return {
+            "replica_chars": size,
+            "replica_tombstones": tombstones,
+            "tombstone_ratio": tombstones / size if size else 0.0,
+            "pending_inserts": pending,
+            "peers_connected": len(node.peer_sockets),
+            "snapshot_transfers": len(node._transfers),
+            "join_ready": 1 if join["ready"] else 0,
+            "join_seconds": join["seconds"] or 0.0,
+            "join_bytes_received": sum(join["bytes"].values()),
+        }
+
+    def snapshot(self) -> dict:
+        with self._mutex:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters[f"{name}{{{labels}}}" if labels else name] = value
+            histograms = {name: h.to_dict() for name, h in sorted(self.histograms.items())}
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+            "gauges": self.gauges(),
+        }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._mutex:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE crdt_{name} counter")
+                    typed.add(name)
+                lines.append(f"crdt_{name}{{{labels}}} {value}" if labels else f"crdt_{name} {value}")
+            for name, hist in histograms:
+                lines.append(f"# TYPE crdt_{name} histogram")
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f'crdt_{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'crdt_{name}_bucket{{le="+Inf"}} {hist.count}')
+                lines.append(f"crdt_{name}_sum {hist.sum}")
+                lines.append(f"crdt_{name}_count {hist.count}")
+        for name, value in self.gauges().items():
+            lines.append(f"# TYPE crdt_{name} gauge")
+            lines.append(f"crdt_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Endpoint HTTP local opcional: /metrics (texto Prometheus) e /stats (JSON)
+    def serve(self, host: str = "127.0.0.1", port: int = 9100):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.to_prometheus().encode()
+                    ctype = "text/plain; version=0.0.4"
+                elif self.path in ("/", "/stats"):
+                    body = json.dumps(metrics.snapshot(), indent=2).encode()
+                    ctype = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
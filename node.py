@@ -1,51 +1,129 @@
+import base64
 import json
-import socket
+import os
 import threading
-import time
 import traceback
-from typing import List, Tuple
-
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import ingest
+from metrics import Metrics
+from optrace import TraceWriter
+from profiling import Profiler
+from replica import ColumnarReplica, ListReplica, ReplicaView
+from transport import TcpTransport, Transport
 from utils import VectorClock, PositionID, Char
 
+# Snapshots em streaming: caracteres por chunk e chunks enviados sem ack
+SNAPSHOT_CHUNK = 1000
+SNAPSHOT_WINDOW = 4
+
 
 class Node:
     def __init__(
-        self, site_id: str, host: str, port: int, peer_addrs: List[Tuple[str, int]]
+        self,
+        site_id: str,
+        host: str,
+        port: int,
+        peer_addrs: List[Tuple[str, int]],
+        columnar: bool = False,
+        metrics: Optional[Metrics] = None,
+        export: bool = True,
+        transport: Optional[Transport] = None,
+        trace: Optional[TraceWriter] = None,
     ):
         self.site_id = site_id
         self.host = host
         self.port = port
         self.peer_addrs = peer_addrs
+        # exporta o texto para site_<id>.txt a cada insert (desligado em benchmarks)
+        self.export = export
         self.vclock = VectorClock()
+        # relógio de Lamport: maior timestamp aplicado (ordena os inserts)
+        self.lamport = 0
         self.lock = threading.RLock()
-
-        # lista de objetos Char (incluindo deletados)
-        self.replica: List[Char] = []
+        # por padrão, TCP real; o simulador (sim.SimNetwork) fornece outro transporte
+        self.transport = transport if transport is not None else TcpTransport(host, port, peer_addrs)
+
+        # caracteres na ordem do documento (incluindo deletados); por padrão uma
+        # lista de objetos Char, ou colunas paralelas com columnar=True
+        self.replica = ColumnarReplica() if columnar else ListReplica()
+        # versão da réplica (sobe a cada insert/delete aplicado) e a última cópia
+        # imutável publicada para leitores sem lock (ver view())
+        self._version = 0
+        self._view: Optional[ReplicaView] = None
+
+        # índice PositionID.key() -> PositionID canônico guardado na réplica
+        self.chars: Dict[tuple, PositionID] = {}
+        # posição na réplica do último caractere inserido (atalho para _position_of)
+        self._last_idx = -1
 
         # operações já vistas (para evitar duplicações)
         self.seen_op = set()
 
         # inserts pendentes cujo parent ainda não chegou
         self.pending_inserts = {}
-
-        # Networking
-        self.server_sock = None
+        # deletes que chegaram antes do insert do caractere alvo
+        self._early_deletes = set()
+
+        # contadores de cada site já aplicados sem lacunas (site -> contador), mais os
+        # que chegaram fora de ordem; é o "relógio" usado para pedir deltas aos peers
+        self.applied: Dict[str, int] = {}
+        self._applied_ahead: Dict[str, set] = {}
+        # op_ids de todos os deletes aplicados, em ordem de chegada (só cresce)
+        self.delete_log: List[dict] = []
+        # (site que deletou, contador) -> posição no delete_log, para achar deltas
+        self._delete_index: Dict[tuple, int] = {}
+
+        # bootstrap: um peer fornece o snapshot e os demais só enviam deltas
+        self.join = {
+            "started": self.transport.now(),
+            "source": None,
+            "waiting": [],
+            "pending": set(),
+            "snapshot_at": None,
+            "ready_at": None,
+            "bytes": {},
+        }
+
+        # Networking: conexões de saída abertas pelo transporte ("host:porta" -> conn)
         self.peer_sockets = {}
-        self.listener_thread = None
-        self.stop_event = threading.Event()
+        # site_id do peer em cada conexão (de saída ou aceita), aprendido no hello, e
+        # os bytes que a conexão trafegou antes disso, para rotular as métricas de rede
+        self._conn_sites = {}
+        self._unlabeled_bytes = {}
+        self._bytes_lock = threading.Lock()
+        # último status anunciado por cada peer (site -> {"applied", "done"}), ver send_status
+        self.peer_status: Dict[str, dict] = {}
+
+        # snapshots em streaming: transferências que estamos enviando (transfer_id -> estado)
+        # e, para cada peer que nos envia um snapshot, quantos caracteres já aplicamos
+        self._transfers = {}
+        self._transfer_seq = 0
+        self._snapshot_progress = {}
+        # peers cuja transferência atual foi retomada de um offset: o que entrou antes
+        # do offset enquanto a conexão estava caída só chega num delta depois do done
+        self._resumed = set()
+
+        # instrumentação opcional: sem Metrics, nenhum método é embrulhado
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.instrument(self)
+        # gravação opcional das operações (locais e recebidas) para replay
+        self.trace = trace
+        # profiling sob demanda: criado na primeira chamada a profile_*/memprofile
+        self.profiler: Optional[Profiler] = None
+        # observador opcional de um arquivo editado externamente (ver watch())
+        self.watcher: Optional[ingest.FileWatcher] = None
 
         # começa o networking
-        self._start_networking()
+        self.transport.start(self)
 
     # Insert baseado na posição visível
     def insert(self, caractere: str, position_index: int):
         with self.lock:
-            # incrementa relógio local
-            self.vclock.increment(self.site_id)
-            pid = PositionID(self.vclock.copy(), self.site_id)
-
             # Determina pos_id (PositionID do caractere anterior, em termos de texto visível)
-            visible = [c for c in self.replica if not c.deleted]
+            visible = self.replica.visible_ids()
 
             if position_index < 0:
                 position_index = -1
@@ -60,46 +138,116 @@ class Node:
                 pos_id = None
             else:
                 # inserir na posição i -> depois do caractere i-1
-                pos_id = visible[position_index - 1].id
-
-            op = {
-                "type": "insert",
-                "site_id": self.site_id,
-                "pos_id": pos_id.serialize() if pos_id else None,
-                "char": caractere,
-                "op_id": pid.serialize(),
-            }
+                pos_id = visible[position_index - 1]
 
-            # aplica localmente via merge
-            self.merge(op, origin_local=True)
-            # broadcast
-            self._broadcast(op)
+            self._local_insert(caractere, pos_id)
 
     # Delete baseado na posição visível
     def delete(self, position_index: int):
         with self.lock:
-            visible = [c for c in self.replica if not c.deleted]
+            visible = self.replica.visible_ids()
             if position_index < 0 or position_index >= len(visible):
                 print("Invalid delete index")
                 return
-            target = visible[position_index]
+            self._local_delete(visible[position_index])
 
-            # increment clock (deletion is an operation)
-            self.vclock.increment(self.site_id)
-
-            del_op_id = {
-                "target": target.id.serialize(),
-                "deleter_site": self.site_id,
-                "vclock": self.vclock.serialize(),
-            }
-            op = {
-                "type": "delete",
-                "site_id": self.site_id,
-                "target_id": target.id.serialize(),
-                "op_id": del_op_id,
-            }
-            self.merge(op, origin_local=True)
-            self._broadcast(op)
+    # Insert ancorado: insere `text` logo após o caractere `anchor_id` (None = início),
+    # sem resolver índices visíveis. Retorna os IDs criados, em ordem.
+    def insert_after(self, anchor_id: Optional[PositionID], text: str) -> List[PositionID]:
+        with self.lock:
+            if anchor_id is not None and anchor_id.key() not in self.chars:
+                print("Invalid anchor id")
+                return []
+            ids = []
+            pos_id = anchor_id
+            for caractere in text:
+                pos_id = self._local_insert(caractere, pos_id)
+                ids.append(pos_id)
+            return ids
+
+    # Delete por ID: ignora IDs desconhecidos ou já removidos
+    def delete_ids(self, ids: Iterable[PositionID]):
+        with self.lock:
+            for pid in ids:
+                target = self.chars.get(pid.key())
+                if target is None or self.replica.is_deleted(target):
+                    continue
+                self._local_delete(target)
+
+    # Substitui o texto visível por `text` com o mínimo de operações (só os trechos
+    # inseridos e removidos, via diff); devolve as contagens aplicadas
+    def ingest_text(self, text: str) -> dict:
+        return ingest.apply_text(self, text)
+
+    # Carrega um arquivo existente (ex: um documento grande) no documento
+    def load_file(self, path: str) -> dict:
+        with open(path, encoding="utf-8") as f:
+            return self.ingest_text(f.read())
+
+    # Passa a ingerir edições externas de `path` (por padrão, o próprio site_<id>.txt)
+    def watch(self, path: Optional[str] = None, interval: float = 0.5) -> ingest.FileWatcher:
+        self.unwatch()
+        self.watcher = ingest.FileWatcher(self, path or self.export_path(), interval)
+        self.watcher.start()
+        return self.watcher
+
+    def unwatch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    # Cria um cursor na posição visível indicada (por padrão, no fim do texto)
+    def cursor(self, position_index: Optional[int] = None) -> "Cursor":
+        cur = Cursor(self)
+        if position_index is not None:
+            cur.move_to(position_index)
+        else:
+            with self.lock:
+                cur.anchor = self._last_visible_before(len(self.replica))
+        return cur
+
+    def _local_insert(self, caractere: str, pos_id: Optional[PositionID]) -> PositionID:
+        # incrementa relógio local
+        self.vclock.increment(self.site_id)
+        self.lamport += 1
+        pid = PositionID(self.site_id, self.vclock.v[self.site_id], self.lamport)
+
+        op = {
+            "type": "insert",
+            "site_id": self.site_id,
+            "pos_id": pos_id.serialize() if pos_id else None,
+            "char": caractere,
+            "op_id": pid.serialize(),
+        }
+
+        # aplica localmente via merge
+        if self.trace is not None:
+            self.trace.record(self.transport.now(), self.site_id, "local", op)
+        self.merge(op, origin_local=True)
+        # broadcast
+        self._broadcast(op)
+        return pid
+
+    def _local_delete(self, target: PositionID):
+        # increment clock (deletion is an operation)
+        self.vclock.increment(self.site_id)
+
+        del_op_id = {
+            "target": target.serialize(),
+            "deleter_site": self.site_id,
+            # como nos IDs, só a entrada do próprio site (o contador do delete)
+            "vclock": {self.site_id: self.vclock.v[self.site_id]},
+        }
+        op = {
+            "type": "delete",
+            "site_id": self.site_id,
+            "target_id": target.serialize(),
+            "op_id": del_op_id,
+        }
+        if self.trace is not None:
+            self.trace.record(self.transport.now(), self.site_id, "local", op)
+        self.merge(op, origin_local=True)
+        self._broadcast(op)
 
     # Aplica uma operação (local ou remota) na réplica
     def merge(self, mensagem_op: dict, origin_local: bool = False):
@@ -107,10 +255,10 @@ class Node:
             with self.lock:
                 typ = mensagem_op.get("type")
 
-                # Para inserts, só marcamos seen_op quando realmente inserirmos o Char.
+                # Inserts são deduplicados por self.chars, quando o Char entra na réplica.
                 # Para deletes, podemos marcar direto, pois não há dependência.
                 if typ != "insert":
-                    op_key = json.dumps(mensagem_op.get("op_id"), sort_keys=True)
+                    op_key = self._op_key(mensagem_op.get("op_id"))
                     if op_key in self.seen_op:
                         return
                     self.seen_op.add(op_key)
@@ -124,233 +272,570 @@ class Node:
         except Exception:
             traceback.print_exc()
 
-    # Aplica um insert estilo RGA simplificado, seguindo uma lógica de predecessor (parent), com buffer de pendentes
-    def _merge_insert(self, op: dict):
-        pid = PositionID.deserialize(op.get("op_id"))
+    # Chave de deduplicação de um delete: (site que deletou, contador dele), como as
+    # chaves dos inserts. Deletes montados a partir de snapshot vêm sem relógio e
+    # usam o op_id inteiro em JSON.
+    @staticmethod
+    def _op_key(op_id):
+        if isinstance(op_id, dict):
+            site = op_id.get("deleter_site")
+            counter = (op_id.get("vclock") or {}).get(site, 0)
+            if counter:
+                return (site, counter)
+        return json.dumps(op_id, sort_keys=True)
+
+    # Incorpora ao relógio local as entradas maiores de `clock`
+    def _merge_clock(self, clock: Dict[str, int]):
+        local = self.vclock.v
+        get = local.get
+        local.update([(s, c) for s, c in clock.items() if c > get(s, 0)])
+
+    # Aplica um insert estilo RGA simplificado, seguindo uma lógica de predecessor (parent), com buffer de pendentes.
+    # Devolve True se o caractere entrou na réplica agora (False: duplicado ou pendente).
+    def _merge_insert(self, op: dict) -> bool:
+        op_id = op.get("op_id")
         char_val = op.get("char")
         parent_serial = op.get("pos_id")
-        parent_id = PositionID.deserialize(parent_serial) if parent_serial else None
 
-        # evita duplicata se o Char já existe na réplica
-        for c in self.replica:
-            if c.id and c.id.serialize() == pid.serialize():
-                return
+        # evita duplicata se o Char já existe na réplica (self.chars também faz o
+        # papel de seen_op para inserts)
+        pid_key = PositionID.key_of(op_id)
+        if pid_key in self.chars:
+            return False
 
         # Se há parent e ele ainda não existe, guarda em pendentes
-        if parent_id is not None and not self._has_char_with_id(parent_id):
-            parent_key = json.dumps(parent_id.serialize(), sort_keys=True)
-            self.pending_inserts.setdefault(parent_key, []).append(op)
-            return
-        
-        # Marca operação como vista
-        op_key = json.dumps(op.get("op_id"), sort_keys=True)
-        if op_key in self.seen_op:
-            return
-        self.seen_op.add(op_key)
-
-        new_char = Char(char_val, pid, parent_id, deleted=False)
+        parent_ref = None
+        if parent_serial:
+            parent_key = PositionID.key_of(parent_serial)
+            parent_ref = self.chars.get(parent_key)
+            if parent_ref is None:
+                self.pending_inserts.setdefault(parent_key, []).append(op)
+                return False
 
-        # RGA simplificado: insere após o parent, ordenando irmãos por ID
-        parent_idx = -1
-        if parent_id is not None:
-            for i, c in enumerate(self.replica):
-                if c.id and c.id.serialize() == parent_id.serialize():
-                    parent_idx = i
-                    break
+        pid = PositionID.deserialize(op_id)
 
-        insert_idx = parent_idx + 1
-
-        # Avança enquanto o elemento atual tiver o mesmo parent
-        # e o ID dele for "menor" que o new_char (para ordenar irmãos)
-        while insert_idx < len(self.replica):
-            cur = self.replica[insert_idx]
-
-            same_parent = (
-                (parent_id is None and cur.parent is None)
-                or (
-                    parent_id is not None
-                    and cur.parent is not None
-                    and cur.parent.serialize() == parent_id.serialize()
-                )
-            )
-
-            if not same_parent:
-                # encontramos um caractere com outro parent → fim do bloco de irmãos
-                break
-
-            # se o new_char deve vir antes de cur, paramos aqui
-            # só compara IDs se estiver dentro da sublista de IRMÃOS
-            if same_parent:
-                if new_char.id.before(cur.id):
-                    break
-            else:
-                # encontrou um elemento que NÃO é da mesma família
-                break
+        # o parent é guardado como a referência do PositionID já existente na réplica
+        new_char = Char(char_val, pid, parent_ref, deleted=False)
 
+        # RGA: insere após o parent, pulando os irmãos mais novos (e as subárvores
+        # deles, que sempre têm timestamp maior que o próprio irmão)
+        parent_idx = self._position_of(parent_ref) if parent_ref is not None else -1
 
+        insert_idx = parent_idx + 1
+        ts = pid.timestamp()
+        replica = self.replica
+        while insert_idx < len(replica) and replica.id_at(insert_idx).timestamp() > ts:
             insert_idx += 1
 
         self.replica.insert(insert_idx, new_char)
-
-        # atualiza relogio local com o max do vclock do pid
-        for s, c in pid.vclock.v.items():
-            self.vclock.v[s] = max(self.vclock.v.get(s, 0), c)
+        self._version += 1
+        # pid.key() reaproveita o site internado e o contador guardados no próprio pid
+        self.chars[pid.key()] = pid
+        self._last_idx = insert_idx
+        if pid_key in self._early_deletes:
+            # o delete deste caractere chegou antes do insert
+            self._early_deletes.discard(pid_key)
+            self.replica.mark_deleted(pid, insert_idx)
+
+        # atualiza relogio local com o contador do pid e o Lamport com o timestamp dele
+        if pid.counter > self.vclock.v.get(pid.site, 0):
+            self.vclock.v[pid.site] = pid.counter
+        if pid.lamport > self.lamport:
+            self.lamport = pid.lamport
+        self._record_applied(pid.site, pid.counter)
 
         # processa filhos pendentes deste novo char
         self._apply_pending_children(pid)
 
         # exporta o texto atual para o arquivo
-        self.export_to_file()
-  
+        if self.export:
+            self.export_to_file()
+        return True
+
     def _has_char_with_id(self, pid: PositionID) -> bool:
-        for c in self.replica:
-            if c.id and c.id.serialize() == pid.serialize():
-                return True
-        return False
+        return pid.key() in self.chars
+
+    # Índice de `pid` na réplica. Tenta primeiro a posição do último insert, que é
+    # o caso comum ao digitar em sequência, e só então varre a réplica.
+    def _position_of(self, pid: PositionID) -> int:
+        idx = self.replica.index_of(pid, self._last_idx)
+        if idx >= 0:
+            self._last_idx = idx
+        return idx
+
+    # ID do último caractere visível antes do índice `idx` da réplica (None = início).
+    # A posição encontrada vira o atalho de _position_of: é onde fica a nova âncora
+    # do cursor, procurada logo em seguida (ex: backspaces seguidos).
+    def _last_visible_before(self, idx: int) -> Optional[PositionID]:
+        for i in range(idx - 1, -1, -1):
+            if not self.replica.deleted_at(i):
+                self._last_idx = i
+                return self.replica.id_at(i)
+        return None
 
     # quando um parent é inserido, aplicamos todos os inserts pendentes que apontavam para ele
     def _apply_pending_children(self, parent_pid: PositionID):
-        
-        parent_key = json.dumps(parent_pid.serialize(), sort_keys=True)
-        children = self.pending_inserts.pop(parent_key, [])
+        children = self.pending_inserts.pop(parent_pid.key(), [])
         for child_op in children:
             # agora que garantimos que o parent existe; chamamos _merge_insert de novo
             self._merge_insert(child_op)
 
-    def _merge_delete(self, op: dict):
+    # Devolve True se o delete foi aplicado (ou guardado até o insert do alvo chegar)
+    def _merge_delete(self, op: dict) -> bool:
         target_serial = op.get("target_id")
         if target_serial is None:
-            return
-
-        target_pid = PositionID.deserialize(target_serial)
+            return False
 
         # localiza por id e seta deleted = True
-        for c in self.replica:
-            if c.id and c.id.serialize() == target_pid.serialize():
-                c.deleted = True
-                break
+        target_key = PositionID.key_of(target_serial)
+        target = self.chars.get(target_key)
+        if target is not None:
+            # deletes locais vêm logo depois de _position_of(target): o atalho acerta
+            self.replica.mark_deleted(target, self._last_idx)
+            self._version += 1
+        else:
+            self._early_deletes.add(target_key)
 
         opid = op.get("op_id")
         if isinstance(opid, dict) and opid.get("vclock"):
-            for s, c in opid["vclock"].items():
-                self.vclock.v[s] = max(self.vclock.v.get(s, 0), c)
-
-    def _start_networking(self):
-        # inicia servidor para aceitar conexões de peers
-        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_sock.bind((self.host, self.port))
-        self.server_sock.listen(5)
-        self.listener_thread = threading.Thread(target=self._accept_loop, daemon=True)
-        self.listener_thread.start()
-
-        # inicia thread de conexão aos peers
-        ct = threading.Thread(target=self._connect_to_peers_loop, daemon=True)
-        ct.start()
-
-    # loop que aceita conexões de entrada
-    def _accept_loop(self):
-        while not self.stop_event.is_set():
-            try:
-                client, addr = self.server_sock.accept()
-                t = threading.Thread(target=self._handle_conn, args=(client, addr), daemon=True)
-                t.start()
-            except Exception:
-                pass
-
-    # tenta conectar aos peers periodicamente
-    def _connect_to_peers_loop(self):
-        while not self.stop_event.is_set():
-            for (ph, pp) in self.peer_addrs:
-                addr_str = f"{ph}:{pp}"
-                if addr_str in self.peer_sockets:
-                    continue
-                try:
-                    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    s.settimeout(2.0)
-                    s.connect((ph, pp))
-                    s.settimeout(None)
-                    self.peer_sockets[addr_str] = s
-                    t = threading.Thread(target=self._handle_conn, args=(s, (ph, pp)), daemon=True)
-                    t.start()
-                    self._send_message(s, {"type": "sync_request", "site_id": self.site_id})
-                except Exception:
-                    time.sleep(0.1)
-            time.sleep(1.0)
-
-    # lida com as mensagens recebidas
-    def _handle_conn(self, conn: socket.socket, addr):
-        try:
-            buf = b""
-            while not self.stop_event.is_set():
-                data = conn.recv(4096)
-                if not data:
-                    break
-                buf += data
-                # mensagens separadas por \n
-                while b"\n" in buf:
-                    line, buf = buf.split(b"\n", 1)
-                    try:
-                        msg = json.loads(line.decode())
-                        self._process_incoming(msg, conn)
-                    except Exception:
-                        traceback.print_exc()
-                        continue
-        except Exception:
-            pass
-        finally:
-            # remove de peer_sockets se desconectar
-            try:
-                conn.close()
-            except Exception:
-                pass
-            keys = [k for k, v in self.peer_sockets.items() if v == conn]
-            for k in keys:
-                del self.peer_sockets[k]
-
-    def _process_incoming(self, msg: dict, conn: socket.socket):
+            self._merge_clock(opid["vclock"])
+            deleter = opid.get("deleter_site")
+            self._delete_index[(deleter, opid["vclock"].get(deleter, 0))] = len(self.delete_log)
+            self.delete_log.append(opid)
+            self._record_applied(deleter, opid["vclock"].get(deleter, 0))
+        return True
+
+    # Registra a operação `counter` do `site`. Cada site numera suas operações
+    # (inserts e deletes) em sequência, então applied[site] só avança sem lacunas.
+    def _record_applied(self, site: str, counter: int):
+        done = self.applied.get(site, 0)
+        if counter <= done:
+            return
+        if counter > done + 1:
+            self._applied_ahead.setdefault(site, set()).add(counter)
+            return
+        ahead = self._applied_ahead.get(site)
+        done = counter
+        while ahead and done + 1 in ahead:
+            done += 1
+            ahead.discard(done)
+        self.applied[site] = done
+
+    # Operações aplicadas além das lacunas de `applied`, por site (vão no pedido de
+    # delta para o peer não reenviar o que já chegou depois de uma mensagem perdida)
+    def _ahead(self) -> Dict[str, List[int]]:
+        return {site: sorted(counters) for site, counters in self._applied_ahead.items() if counters}
+
+    # Callbacks do transporte
+    def _on_message(self, msg: dict, conn, addr_str: str, nbytes: int):
+        if msg.get("type") == "snapshot_chunk" and self.join["ready_at"] is None:
+            join_bytes = self.join["bytes"]
+            join_bytes[addr_str] = join_bytes.get(addr_str, 0) + nbytes
+        if self.trace is not None and msg.get("type") in ("insert", "delete"):
+            self.trace.record(self.transport.now(), self.site_id, addr_str, msg)
+        self._process_incoming(msg, conn)
+
+    # Bytes trafegados numa conexão, rotulados pelo site do peer e não pelo endereço:
+    # conexões aceitas vêm de portas efêmeras, e as duas direções e as reconexões de
+    # um peer devem somar numa única série. Até o hello chegar, ficam guardados.
+    def _on_bytes(self, conn, n: int, sent: bool):
+        if self.metrics is None:
+            return
+        with self._bytes_lock:
+            site = self._conn_sites.get(conn)
+            if site is None:
+                pending = self._unlabeled_bytes.setdefault(conn, [0, 0])
+                pending[sent] += n
+                return
+        if sent:
+            self._count_bytes(site, 0, n)
+        else:
+            self._count_bytes(site, n, 0)
+
+    def _count_bytes(self, site: str, received: int, sent: int):
+        if received:
+            self.metrics.on_bytes_received(site, received)
+        if sent:
+            self.metrics.on_bytes_sent(site, sent)
+
+    def _on_conn_closed(self, conn, addr_str: str):
+        with self._bytes_lock:
+            self._conn_sites.pop(conn, None)
+            pending = self._unlabeled_bytes.pop(conn, None)
+        if pending is not None and self.metrics is not None:
+            # a conexão caiu antes do hello: os bytes ficam sem site
+            self._count_bytes("?", *pending)
+        # remove de peer_sockets se desconectar
+        keys = [k for k, v in self.peer_sockets.items() if v == conn]
+        for k in keys:
+            del self.peer_sockets[k]
+        if keys:
+            self._on_peer_lost(addr_str)
+        # descarta snapshots que estávamos enviando por esta conexão
+        for tid in [t for t, tr in list(self._transfers.items()) if tr["conn"] is conn]:
+            self._transfers.pop(tid, None)
+
+    def _process_incoming(self, msg: dict, conn):
         typ = msg.get("type")
+        if typ == "hello":
+            self._on_hello(msg, conn)
+            return
+
         if typ == "sync_request":
-            snapshot = [c.serialize() for c in self.replica]
+            if msg.get("stream"):
+                self._start_transfer(
+                    conn, msg.get("offset", 0), msg.get("del_offset", 0), msg.get("since"), msg.get("ahead")
+                )
+                return
+            snapshot = self.view().snapshot()
             resp = {"type": "sync_response", "site_id": self.site_id, "snapshot": snapshot}
             self._send_message(conn, resp)
             return
 
+        if typ == "status":
+            with self.lock:
+                self.peer_status[msg.get("site_id")] = {"applied": msg.get("applied", {}), "done": msg.get("done")}
+            return
+
         if typ == "sync_response":
-            snapshot = msg.get("snapshot", [])
-            for cobj in snapshot:
-                pseudo_insert = {
-                    "type": "insert",
-                    "site_id": msg.get("site_id"),
-                    "pos_id": cobj.get("parent"),
-                    "char": cobj["value"],
-                    "op_id": cobj["id"],
-                }
-                if cobj.get("deleted"):
-                    # aplica insert primeiro, depois delete
-                    self.merge(pseudo_insert)
-                    del_op = {
-                        "type": "delete",
-                        "site_id": self.site_id,
-                        "target_id": cobj["id"],
-                        "op_id": {
-                            "target": cobj["id"],
-                            "deleter_site": msg.get("site_id"),
-                            "vclock": {},
-                        },
-                    }
-                    self.merge(del_op)
-                else:
-                    self.merge(pseudo_insert)
+            self._apply_snapshot(msg.get("snapshot", []), msg.get("site_id"))
+            return
+
+        if typ == "snapshot_chunk":
+            self._receive_chunk(msg, conn)
+            return
+
+        if typ == "snapshot_ack":
+            transfer = self._transfers.get(msg.get("transfer_id"))
+            if transfer is not None:
+                transfer["unacked"] -= 1
+                self._pump_transfer(msg["transfer_id"])
             return
 
         # aplica merge genérico (insert/delete)
         self.merge(msg)
 
-    def _send_message(self, conn: socket.socket, msg: dict):
+    # Aplica um snapshot (lista de Char serializados) como inserts/deletes
+    def _apply_snapshot(self, snapshot: List[dict], source_site: str):
+        for cobj in snapshot:
+            pseudo_insert = {
+                "type": "insert",
+                "site_id": source_site,
+                "pos_id": cobj.get("parent"),
+                "char": cobj["value"],
+                "op_id": cobj["id"],
+            }
+            if cobj.get("deleted"):
+                # aplica insert primeiro, depois delete
+                self.merge(pseudo_insert)
+                del_op = {
+                    "type": "delete",
+                    "site_id": self.site_id,
+                    "target_id": cobj["id"],
+                    "op_id": {
+                        "target": cobj["id"],
+                        "deleter_site": source_site,
+                        "vclock": {},
+                    },
+                }
+                self.merge(del_op)
+            else:
+                self.merge(pseudo_insert)
+
+    # Snapshot em streaming (lado de quem envia): a réplica vai em chunks numerados
+    # e comprimidos, no máximo SNAPSHOT_WINDOW sem ack, montados um de cada vez.
+    # Como a réplica só cresce (deletes viram tombstones), inserts concorrentes
+    # apenas deslocam linhas para a frente: o pior caso é reenviar um caractere,
+    # o que o merge já ignora. O que for inserido atrás do offset chega por broadcast
+    # (numa transferência retomada, o receptor pede um delta depois do done).
+    # Junto com as linhas vai o delete_log, para o receptor saber quais deletes
+    # (e contadores) já tem. Com `since`, só vai o que é posterior a esse relógio
+    # (menos os contadores de `ahead`, que o peer já aplicou): o delta é achado pelos
+    # contadores (_delta_since) e cada chunk leva até SNAPSHOT_CHUNK linhas e deletes
+    # do delta; aí os offsets contam posições na lista do delta, não na réplica.
+    # Delta vazio = um chunk com done.
+    def _start_transfer(
+        self,
+        conn,
+        offset: int,
+        del_offset: int = 0,
+        since: Optional[Dict[str, int]] = None,
+        ahead: Optional[Dict[str, List[int]]] = None,
+    ):
+        with self.lock:
+            self._transfer_seq += 1
+            transfer_id = f"{self.site_id}-{self._transfer_seq}"
+            transfer = self._transfers[transfer_id] = {
+                "conn": conn,
+                "pump": threading.Lock(),
+                "offset": max(0, offset),
+                "del_offset": max(0, del_offset),
+                "since": since,
+                "ahead": ahead,
+                "seq": 0,
+                "unacked": 0,
+                "done": False,
+            }
+            if since is not None:
+                transfer.update(wanted=[], picked=set(), dels=[], del_len=0)
+                self._select_delta(transfer)
+        self._pump_transfer(transfer_id)
+
+    # Acrescenta à transferência o que entrou no delta desde a última seleção: os IDs
+    # inseridos, em ordem de documento, e as posições dos deletes no delete_log (que
+    # só cresce, então os anteriores a del_len já foram considerados). Chamado com o lock.
+    def _select_delta(self, transfer: dict):
+        pids, deletes = self._delta_since(transfer["since"], transfer["ahead"])
+        picked = transfer["picked"]
+        pids = [pid for pid in pids if pid not in picked]
+        picked.update(pids)
+        transfer["wanted"].extend(self.replica.id_at(i) for i in self.replica.select(pids))
+        transfer["dels"].extend(p for p in deletes if p >= transfer["del_len"])
+        transfer["del_len"] = len(self.delete_log)
+        transfer["size"] = len(self.replica)
+
+    # Inserts e deletes posteriores a `since`, achados pelas chaves (site, contador):
+    # cada site numera suas operações em sequência, então basta olhar os contadores
+    # entre since[site] e o maior visto, pulando os de ahead[site]. O custo é
+    # proporcional ao delta.
+    def _delta_since(
+        self, since: Dict[str, int], ahead: Optional[Dict[str, List[int]]] = None
+    ) -> Tuple[List[PositionID], List[int]]:
+        chars, delete_index = self.chars, self._delete_index
+        ahead = ahead or {}
+        pids, deletes = [], []
+        for site, top in self.vclock.v.items():
+            have = ahead.get(site)
+            counters = range(since.get(site, 0) + 1, top + 1)
+            if have:
+                counters = sorted(set(counters).difference(have))
+            for counter in counters:
+                key = (site, counter)
+                pid = chars.get(key)
+                if pid is not None:
+                    pids.append(pid)
+                elif key in delete_index:
+                    deletes.append(delete_index[key])
+        deletes.sort()
+        return pids, deletes
+
+    # As linhas de cada chunk são lidas da réplica sob o lock, só a faixa do chunk
+    # (ou, num delta, as posições dos seus IDs): a transferência não guarda cópia do
+    # documento, então a memória por transferência não depende do tamanho dele.
+    # Serializar e comprimir o chunk fica fora do lock.
+    def _pump_transfer(self, transfer_id: str):
+        transfer = self._transfers.get(transfer_id)
+        if transfer is None:
+            return
+        # um pump por vez em cada transferência, para os chunks saírem na ordem de seq
+        with transfer["pump"]:
+            while True:
+                with self.lock:
+                    if self._transfers.get(transfer_id) is not transfer or transfer["unacked"] >= SNAPSHOT_WINDOW:
+                        return
+                    if transfer["done"]:
+                        if transfer["unacked"] == 0:
+                            del self._transfers[transfer_id]
+                        return
+                    offset = transfer["offset"]
+                    del_offset = transfer["del_offset"]
+                    since = transfer["since"]
+                    if since is None:
+                        stop = min(offset + SNAPSHOT_CHUNK, len(self.replica))
+                        del_stop = min(del_offset + SNAPSHOT_CHUNK, len(self.delete_log))
+                        rows = self.replica.snapshot(offset, stop)
+                        deletes = self.delete_log[del_offset:del_stop]
+                        done = stop >= len(self.replica) and del_stop >= len(self.delete_log)
+                    else:
+                        wanted, dels = transfer["wanted"], transfer["dels"]
+                        grew = len(self.replica) > transfer["size"] or len(self.delete_log) > transfer["del_len"]
+                        if offset >= len(wanted) and del_offset >= len(dels) and grew:
+                            # o delta selecionado já foi e a réplica mudou: acrescenta o novo
+                            self._select_delta(transfer)
+                            grew = False
+                        stop = min(offset + SNAPSHOT_CHUNK, len(wanted))
+                        del_stop = min(del_offset + SNAPSHOT_CHUNK, len(dels))
+                        # posições atuais dos IDs do chunk: um passe em C pela réplica
+                        rows = self.replica.rows(self.replica.select(wanted[offset:stop]))
+                        deletes = [self.delete_log[p] for p in dels[del_offset:del_stop]]
+                        done = stop >= len(wanted) and del_stop >= len(dels) and not grew
+                    transfer["done"] = done
+                    seq = transfer["seq"]
+                    transfer["offset"] = max(offset, stop)
+                    transfer["del_offset"] = max(del_offset, del_stop)
+                    transfer["seq"] += 1
+                    transfer["unacked"] += 1
+                    conn = transfer["conn"]
+                data = json.dumps({"rows": rows, "deletes": deletes}).encode()
+                chunk = {
+                    "type": "snapshot_chunk",
+                    "site_id": self.site_id,
+                    "transfer_id": transfer_id,
+                    "seq": seq,
+                    "offset": offset,
+                    "count": max(0, stop - offset),
+                    "del_offset": del_offset,
+                    "del_count": max(0, del_stop - del_offset),
+                    "since": since,
+                    "done": done,
+                    "data": base64.b64encode(zlib.compress(data)).decode(),
+                }
+                self._send_message(conn, chunk)
+
+    # Snapshot em streaming (lado de quem recebe): aplica cada chunk assim que chega,
+    # guarda o progresso por peer (para retomar após reconexão) e confirma o chunk
+    def _receive_chunk(self, msg: dict, conn):
+        data = json.loads(zlib.decompress(base64.b64decode(msg["data"])))
+        self._apply_snapshot(data["rows"], msg.get("site_id"))
+        for opid in data["deletes"]:
+            del_op = {"type": "delete", "site_id": opid["deleter_site"], "target_id": opid["target"], "op_id": opid}
+            self.merge(del_op)
+
+        end = msg["offset"] + msg["count"]
+        del_end = msg["del_offset"] + msg["del_count"]
+        for addr_str, s in list(self.peer_sockets.items()):
+            if s is conn:
+                if msg.get("done"):
+                    self._snapshot_progress.pop(addr_str, None)
+                    if addr_str in self._resumed:
+                        # offsets são posições na réplica atual do peer: pede o que
+                        # ficou para trás; o done desse delta conclui a transferência
+                        self._resumed.discard(addr_str)
+                        with self.lock:
+                            since, ahead = dict(self.applied), self._ahead()
+                        self._request_sync(addr_str, conn, since, ahead)
+                    else:
+                        self._on_transfer_done(addr_str)
+                else:
+                    self._snapshot_progress[addr_str] = {"offset": end, "del_offset": del_end, "since": msg.get("since")}
+        ack = {
+            "type": "snapshot_ack",
+            "site_id": self.site_id,
+            "transfer_id": msg["transfer_id"],
+            "seq": msg["seq"],
+            "offset": end,
+        }
+        self._send_message(conn, ack)
+
+    # Pede snapshot (since=None) ou delta a um peer, retomando uma transferência
+    # interrompida com o mesmo peer se houver
+    def _request_sync(
+        self, addr_str: str, conn, since: Optional[Dict[str, int]], ahead: Optional[Dict[str, List[int]]] = None
+    ):
+        progress = self._snapshot_progress.get(addr_str)
+        req = {"type": "sync_request", "site_id": self.site_id, "stream": True, "since": since}
+        if ahead:
+            req["ahead"] = ahead
+        if progress is not None and progress["since"] == since:
+            req["offset"] = progress["offset"]
+            req["del_offset"] = progress["del_offset"]
+            self._resumed.add(addr_str)
+        else:
+            self._snapshot_progress.pop(addr_str, None)
+            self._resumed.discard(addr_str)
+        self._send_message(conn, req)
+
+    # Bootstrap: o primeiro peer alcançado envia o snapshot completo; os demais
+    # ficam na espera e, quando o snapshot termina, só enviam o que for posterior
+    # ao relógio `applied` resultante. Depois de pronto, reconexões pedem só deltas.
+    def _on_peer_connected(self, addr_str: str, conn):
+        with self.lock:
+            self.peer_sockets[addr_str] = conn
+        # já registrada: a resposta ao hello não é confundida com o de uma conexão aceita
+        self._send_message(conn, {"type": "hello", "site_id": self.site_id})
+        with self.lock:
+            if self.metrics is not None:
+                self.metrics.on_connect(addr_str)
+            join = self.join
+            if join["snapshot_at"] is None:
+                if join["source"] is not None:
+                    join["waiting"].append(addr_str)
+                    return
+                join["source"] = addr_str
+                since, ahead = None, None
+            else:
+                if join["ready_at"] is None:
+                    join["pending"].add(addr_str)
+                since, ahead = dict(self.applied), self._ahead()
+        self._request_sync(addr_str, conn, since, ahead)
+
+    # O hello é a primeira mensagem de quem abre a conexão; quem a aceitou responde
+    # com o seu, então os dois lados sabem o site do outro (ver _on_bytes)
+    def _on_hello(self, msg: dict, conn):
+        site = msg.get("site_id")
+        with self._bytes_lock:
+            if site is None or conn in self._conn_sites:
+                return
+            self._conn_sites[conn] = site
+            pending = self._unlabeled_bytes.pop(conn, None)
+        if pending is not None and self.metrics is not None:
+            self._count_bytes(site, *pending)
+        if not any(c is conn for c in list(self.peer_sockets.values())):
+            self._send_message(conn, {"type": "hello", "site_id": self.site_id})
+
+    def _on_peer_lost(self, addr_str: str):
+        with self.lock:
+            join = self.join
+            if addr_str in join["waiting"]:
+                join["waiting"].remove(addr_str)
+            if join["snapshot_at"] is None and join["source"] == addr_str:
+                # a fonte do snapshot caiu: promove o próximo peer em espera
+                join["source"] = None
+                while join["waiting"] and join["source"] is None:
+                    candidate = join["waiting"].pop(0)
+                    conn = self.peer_sockets.get(candidate)
+                    if conn is not None:
+                        join["source"] = candidate
+                        self._request_sync(candidate, conn, None)
+            elif addr_str in join["pending"]:
+                self._on_transfer_done(addr_str)
+
+    def _on_transfer_done(self, addr_str: str):
+        with self.lock:
+            join = self.join
+            if join["ready_at"] is not None:
+                return
+            if join["snapshot_at"] is None:
+                if addr_str != join["source"]:
+                    return
+                join["snapshot_at"] = self.transport.now()
+                since = dict(self.applied)
+                ahead = self._ahead()
+                for waiting in join["waiting"]:
+                    conn = self.peer_sockets.get(waiting)
+                    if conn is not None:
+                        join["pending"].add(waiting)
+                        self._request_sync(waiting, conn, since, ahead)
+                join["waiting"] = []
+            else:
+                join["pending"].discard(addr_str)
+            if not join["pending"]:
+                join["ready_at"] = self.transport.now()
+
+    # Resumo do bootstrap: se terminou, tempos desde o início (snapshot e deltas),
+    # quem forneceu o snapshot e os bytes recebidos de cada peer
+    def join_stats(self) -> dict:
+        with self.lock:
+            join = self.join
+            started = join["started"]
+            return {
+                "ready": join["ready_at"] is not None,
+                "seconds": join["ready_at"] - started if join["ready_at"] is not None else None,
+                "snapshot_seconds": join["snapshot_at"] - started if join["snapshot_at"] is not None else None,
+                "source": join["source"],
+                "bytes": dict(join["bytes"]),
+            }
+
+    @staticmethod
+    def _encode(msg: dict) -> bytes:
+        return (json.dumps(msg, sort_keys=True) + "\n").encode()
+
+    def _send_message(self, conn, msg: dict):
+        self._send_payload(conn, self._encode(msg))
+
+    def _send_payload(self, conn, payload: bytes):
         try:
-            payload = (json.dumps(msg, sort_keys=True) + "\n").encode()
-            conn.sendall(payload)
+            self.transport.send(conn, payload)
         except Exception:
             # se o envio falhar, remove o socket
             keys = [k for k, v in self.peer_sockets.items() if v == conn]
@@ -361,10 +846,14 @@ class Node:
                     pass
 
     def _broadcast(self, msg: dict):
+        if not self.peer_sockets:
+            return
+        # codifica uma vez só para todos os peers
+        payload = self._encode(msg)
         dead = []
         for k, s in list(self.peer_sockets.items()):
             try:
-                self._send_message(s, msg)
+                self._send_payload(s, payload)
             except Exception:
                 dead.append(k)
         for k in dead:
@@ -373,34 +862,155 @@ class Node:
             except Exception:
                 pass
 
+    # Anuncia aos peers o relógio `applied` e se este nó já terminou de editar
+    # (done). Com os status recebidos (peer_status), cada nó sabe quando os peers
+    # terminaram e aplicaram exatamente as mesmas operações que ele.
+    def send_status(self, done: bool):
+        with self.lock:
+            payload = self._encode(
+                {"type": "status", "site_id": self.site_id, "applied": dict(self.applied), "done": done}
+            )
+        for conn in list(self.peer_sockets.values()):
+            self._send_payload(conn, payload)
+
+    # Sites dos peers que terminaram de editar e têm o mesmo `applied` deste nó
+    def converged_peers(self) -> List[str]:
+        with self.lock:
+            return sorted(
+                site for site, st in self.peer_status.items() if st["done"] and st["applied"] == self.applied
+            )
+
+    # Profiling sob demanda (cProfile no merge e nas threads de rede, tracemalloc
+    # para a memória). Os arquivos gravados podem ser analisados offline com
+    # pstats / tracemalloc.Snapshot.load.
+    def _get_profiler(self) -> Profiler:
+        if self.profiler is None:
+            self.profiler = Profiler(self)
+        return self.profiler
+
+    def profile_start(self):
+        self._get_profiler().start()
+
+    def profile_stop(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    # Devolve (arquivo .prof gravado ou None, resumo em texto)
+    def profile_dump(self, path: Optional[str] = None):
+        return self._get_profiler().dump(path)
+
+    # Devolve (arquivo .tracemalloc gravado ou None, resumo em texto)
+    def memprofile(self, path: Optional[str] = None):
+        return self._get_profiler().memprofile(path)
+
+    def memprofile_stop(self):
+        if self.profiler is not None:
+            self.profiler.memprofile_stop()
+
     # Visualização e utils
-    def visible_text(self) -> str:
+    # Cópia imutável da réplica na versão atual. Leitores não concorrem com os
+    # merges: se nada mudou desde a última view, ela é devolvida sem tocar no lock;
+    # senão o lock é preso só pelo tempo de copiar as colunas (freeze).
+    def view(self) -> ReplicaView:
+        view = self._view
+        if view is not None and view.version == self._version:
+            return view
         with self.lock:
-            return "".join([c.value for c in self.replica if not c.deleted])
+            view = self._view
+            if view is None or view.version != self._version:
+                view = self._view = self.replica.freeze(self._version)
+            return view
+
+    def visible_text(self) -> str:
+        return self.view().visible_text()
+
+    def state_hash(self) -> str:
+        return self.view().state_hash()
 
     def show_full(self):
-        with self.lock:
-            for idx, c in enumerate(self.replica):
-                print(f"{idx}: '{c.value}' id={c.id} parent={c.parent} deleted={c.deleted}")
+        for idx, c in enumerate(self.view()):
+            print(f"{idx}: '{c.value}' id={c.id} parent={c.parent} deleted={c.deleted}")
 
     def stop(self):
-        self.stop_event.set()
-        try:
-            self.server_sock.close()
-        except Exception:
-            pass
-        for s in list(self.peer_sockets.values()):
-            try:
-                s.close()
-            except Exception:
-                pass
+        self.unwatch()
+        self.profile_stop()
+        self.transport.stop()
+        if self.trace is not None:
+            self.trace.close()
 
     # Exporta o texto visível para um arquivo local, ex: site_1.txt
+    # (grava num temporário e renomeia, para quem lê o arquivo nunca ver metade dele)
     def export_to_file(self):
-        filename = f"site_{self.site_id}.txt"
-        text = self.visible_text()
-        try:
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(text)
-        except Exception as e:
-            print(f"[ERRO ao salvar arquivo]: {e}")
\ No newline at end of file
+        filename = self.export_path()
+        with self.lock:
+            if self.watcher is not None and self.watcher.changed_on_disk(filename):
+                # edição externa ainda não lida: ingere antes de sobrescrever o arquivo
+                self.watcher.poll()
+            text = self.replica.visible_text()
+            try:
+                tmp = f"{filename}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp, filename)
+            except Exception as e:
+                print(f"[ERRO ao salvar arquivo]: {e}")
+                return
+            if self.watcher is not None:
+                self.watcher.note_export(filename, text, self.replica.visible_ids())
+
+    def export_path(self) -> str:
+        return f"site_{self.site_id}.txt"
+
+
+# Cursor de edição ancorado no ID do caractere à sua esquerda. Como a âncora é um ID
+# (e não um índice), o cursor acompanha automaticamente as edições remotas.
+class Cursor:
+    def __init__(self, node: Node, anchor: Optional[PositionID] = None):
+        self.node = node
+        self.anchor = anchor
+
+    # Digita `text` na posição do cursor e avança o cursor
+    def insert(self, text: str):
+        ids = self.node.insert_after(self.anchor, text)
+        if ids:
+            self.anchor = ids[-1]
+
+    # Apaga até `count` caracteres visíveis à esquerda do cursor (backspace)
+    def delete_backward(self, count: int = 1):
+        node = self.node
+        with node.lock:
+            for _ in range(count):
+                if self.anchor is None:
+                    return
+                target = node.chars.get(self.anchor.key())
+                if target is None:
+                    return
+                idx = node._position_of(target)
+                if node.replica.deleted_at(idx):
+                    # âncora apagada remotamente: recua até o visível anterior
+                    target = node._last_visible_before(idx)
+                    if target is None:
+                        self.anchor = None
+                        return
+                    idx = node._position_of(target)
+                node._local_delete(target)
+                self.anchor = node._last_visible_before(idx)
+
+    # Posição visível atual do cursor (número de caracteres visíveis à esquerda)
+    def index(self) -> int:
+        node = self.node
+        with node.lock:
+            if self.anchor is None:
+                return 0
+            target = node.chars.get(self.anchor.key())
+            if target is None:
+                return 0
+            return node.replica.visible_count(node._position_of(target) + 1)
+
+    # Move o cursor para a posição visível `position_index`
+    def move_to(self, position_index: int):
+        node = self.node
+        with node.lock:
+            visible = node.replica.visible_ids()
+            position_index = min(position_index, len(visible))
+            self.anchor = visible[position_index - 1] if position_index > 0 else None
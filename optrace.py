@@ -0,0 +1,44 @@
+import json
+import threading
+from typing import Iterator, Optional
+
+
+# Gravação das operações vistas por um Node, uma linha JSON por operação:
+#   {"t": <relógio do nó>, "site": <site do nó>, "origin": "local" | "host:porta", "op": {...}}
+# O timestamp vem do Node (transport.now()): tempo real com TCP e tempo virtual no
+# simulador, então o replay com --speed 1.0 reproduz o ritmo da execução gravada.
+# Só entram inserts/deletes (os autorados aqui e os recebidos dos peers); linhas
+# vindas de snapshot são estado, não operações, e não são gravadas.
+class TraceWriter:
+    def __init__(self, path: str):
+        self.path = path
+        # bufferizado por linha: uma queda do processo perde no máximo a última operação
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._mutex = threading.Lock()
+        self.count = 0
+
+    def record(self, t: float, site: str, origin: str, op: dict):
+        line = json.dumps({"t": t, "site": site, "origin": origin, "op": op}, sort_keys=True)
+        with self._mutex:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        with self._mutex:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Lê um trace; com `origin`, só as entradas com essa origem (ex: "local")
+def read_trace(path: str, origin: Optional[str] = None) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if origin is None or entry["origin"] == origin:
+                yield entry
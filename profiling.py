@@ -0,0 +1,165 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+# Métodos do Node medidos pelo cProfile: merge (local e remoto), o callback das
+# threads de rede e o envio das operações locais
+PROFILED_METHODS = ("merge", "_on_message", "_broadcast")
+
+
+# Um cProfile.Profile por thread: o cProfile só enxerga a thread que o ligou,
+# então cada thread que passa pelos métodos medidos ganha o seu. O lock de cada
+# perfil garante que o dump não leia um perfil no meio de uma chamada.
+class _ThreadProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.prof = cProfile.Profile()
+        self.lock = threading.Lock()
+        self.depth = 0
+
+
+# Profiling sob demanda de um Node. Enquanto desligado, nenhum método é
+# embrulhado (custo zero); start() troca os métodos da instância por versões
+# medidas e stop() devolve os originais.
+class Profiler:
+    def __init__(self, node):
+        self.node = node
+        self.active = False
+        self.started_at: Optional[float] = None
+        self._local = threading.local()
+        self._profiles: List[_ThreadProfile] = []
+        self._mutex = threading.Lock()
+        # método -> atributo de instância que havia antes (ex: wrapper do Metrics)
+        self._originals: Dict[str, object] = {}
+        self._last_mem: Optional[tracemalloc.Snapshot] = None
+
+    # cProfile
+    def start(self):
+        with self._mutex:
+            if self.active:
+                return
+            self.active = True
+            self.started_at = time.time()
+            for method in PROFILED_METHODS:
+                self._wrap(method)
+
+    def stop(self):
+        with self._mutex:
+            if not self.active:
+                return
+            self.active = False
+            for method, original in self._originals.items():
+                if original is None:
+                    self.node.__dict__.pop(method, None)
+                else:
+                    setattr(self.node, method, original)
+            self._originals.clear()
+
+    # Grava o perfil acumulado (todas as threads) no formato do pstats e devolve
+    # (caminho, resumo das funções mais caras). Pode ser chamado com o profiling ligado.
+    def dump(self, path: Optional[str] = None, top: int = 15):
+        if path is None:
+            path = f"profile_{self.node.site_id}_{time.strftime('%Y%m%d-%H%M%S')}.prof"
+        with self._mutex:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None, "nenhuma amostra (use profile start e gere carga)"
+        stats = None
+        for tp in profiles:
+            with tp.lock:
+                tp.prof.create_stats()
+                if stats is None:
+                    stats = pstats.Stats(tp.prof)
+                else:
+                    stats.add(tp.prof)
+        stats.dump_stats(path)
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(top)
+        return path, out.getvalue()
+
+    # Descarta as amostras acumuladas
+    def reset(self):
+        with self._mutex:
+            self._profiles = []
+            self._local = threading.local()
+
+    def _wrap(self, method: str):
+        node = self.node
+        self._originals[method] = node.__dict__.get(method)
+        fn = getattr(node, method)
+
+        def profiled(*args, **kwargs):
+            tp = getattr(self._local, "profile", None)
+            if tp is None:
+                tp = self._local.profile = _ThreadProfile(threading.current_thread().name)
+                with self._mutex:
+                    self._profiles.append(tp)
+            # chamadas aninhadas (ex: _on_message -> merge) já estão sendo medidas
+            if tp.depth:
+                return fn(*args, **kwargs)
+            with tp.lock:
+                tp.depth += 1
+                try:
+                    tp.prof.enable()
+                except ValueError:
+                    # outro profiler já ativo neste processo: segue sem medir
+                    tp.depth -= 1
+                    return fn(*args, **kwargs)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    tp.prof.disable()
+                    tp.depth -= 1
+
+        setattr(node, method, profiled)
+
+    # tracemalloc
+    # A primeira chamada liga o tracemalloc; as seguintes gravam um snapshot
+    # (carregável com tracemalloc.Snapshot.load) e resumem o que mais alocou,
+    # comparado com o snapshot anterior.
+    def memprofile(self, path: Optional[str] = None, top: int = 10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._last_mem = self._mem_snapshot()
+            return None, "tracemalloc ligado; rode memprofile de novo para gravar um snapshot"
+        if path is None:
+            path = f"memprofile_{self.node.site_id}_{time.strftime('%Y%m%d-%H%M%S')}.tracemalloc"
+        snap = self._mem_snapshot()
+        snap.dump(path)
+
+        node = self.node
+        with node.lock:
+            size = len(node.replica)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"memória rastreada: {current / 1e6:.1f} MB (pico {peak / 1e6:.1f} MB), "
+            f"{size} caracteres na réplica ({current / size if size else 0:.0f} B/char)"
+        ]
+        if self._last_mem is not None:
+            lines.append("maiores variações desde o snapshot anterior:")
+            for stat in snap.compare_to(self._last_mem, "lineno")[:top]:
+                lines.append(f"  {stat}")
+        else:
+            lines.append("maiores alocações:")
+            for stat in snap.statistics("lineno")[:top]:
+                lines.append(f"  {stat}")
+        self._last_mem = snap
+        return path, "\n".join(lines)
+
+    @staticmethod
+    def _mem_snapshot() -> tracemalloc.Snapshot:
+        # sem as alocações do próprio tracemalloc
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>")]
+        )
+
+    def memprofile_stop(self):
+        self._last_mem = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
@@ -0,0 +1,403 @@
+import hashlib
+from array import array
+from itertools import compress, repeat
+from operator import attrgetter, lshift, not_, or_
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from utils import Char, PositionID
+
+
+# Backends de armazenamento da réplica. Ambos guardam os caracteres (inclusive os
+# deletados) na ordem do documento e expõem a mesma interface para o Node.
+# Os PositionID recebidos pelos métodos são sempre as instâncias canônicas já
+# guardadas na réplica (Node.chars), por isso são comparados por identidade.
+
+
+# Troca 0 <-> 1 numa sequência de flags (deletado -> visível) com bytes.translate
+_FLIP = bytes([1, 0]) + bytes(254)
+
+
+def _row(value: str, pid: PositionID, parent: Optional[PositionID], deleted: bool) -> dict:
+    return {
+        "value": value,
+        "id": pid.serialize(),
+        "parent": parent.serialize() if parent is not None else None,
+        "deleted": deleted,
+    }
+
+
+# Cópia imutável e consistente da réplica numa versão, lida sem o lock do Node.
+# freeze() só copia referências (em C) enquanto o lock está preso; o que custa
+# caro (flags, texto, linhas de snapshot) é derivado depois, fora do lock. Os
+# valores, IDs e parents de um caractere nunca mudam depois de inseridos, então
+# as colunas podem ser montadas depois a partir dos objetos compartilhados (cada
+# coluna é uma sequência ou uma função que a monta na primeira leitura).
+class ReplicaView:
+    def __init__(self, version: int, size: int, alive, values, ids, parents, text=None):
+        self.version = version
+        self._size = size
+        self._columns = {"alive": alive, "values": values, "ids": ids, "parents": parents}
+        # função opcional que monta o texto sem passar pelas colunas
+        self._text = text
+
+    def _column(self, name: str) -> list:
+        col = self._columns[name]
+        if callable(col):
+            col = self._columns[name] = col()
+        return col
+
+    # 1 = visível, 0 = deletado
+    @property
+    def alive(self) -> bytes:
+        return self._column("alive")
+
+    @property
+    def values(self) -> List[str]:
+        return self._column("values")
+
+    @property
+    def ids(self) -> List[PositionID]:
+        return self._column("ids")
+
+    @property
+    def parents(self) -> List[Optional[PositionID]]:
+        return self._column("parents")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Char]:
+        for value, pid, parent, alive in zip(self.values, self.ids, self.parents, self.alive):
+            yield Char(value, pid, parent, not alive)
+
+    def visible_text(self) -> str:
+        if self._text is None:
+            self._text = "".join(compress(self.values, self.alive))
+        elif callable(self._text):
+            self._text = self._text() or "".join(compress(self.values, self.alive))
+        return self._text
+
+    def visible_ids(self) -> List[PositionID]:
+        return list(compress(self.ids, self.alive))
+
+    def visible_count(self, stop: Optional[int] = None) -> int:
+        return self.alive.count(1, 0, len(self.alive) if stop is None else stop)
+
+    def tombstones(self) -> int:
+        return len(self.alive) - self.alive.count(1)
+
+    # Hash do estado (texto visível e tombstones): réplicas convergidas têm o mesmo
+    def state_hash(self) -> str:
+        h = hashlib.sha256(self.visible_text().encode())
+        h.update(str(self.tombstones()).encode())
+        return h.hexdigest()
+
+    def snapshot(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        return self.rows(range(*slice(start, stop).indices(self._size)))
+
+    # Linhas serializadas dos índices dados
+    def rows(self, indices: Iterable[int]) -> List[dict]:
+        values, ids, parents, alive = self.values, self.ids, self.parents, self.alive
+        return [_row(values[i], ids[i], parents[i], not alive[i]) for i in indices]
+
+
+# Layout original: uma lista de objetos Char
+class ListReplica:
+    def __init__(self):
+        self._chars: List[Char] = []
+        # PositionID (hash por identidade) -> Char, para marcar tombstones sem varrer a lista
+        self._by_id: Dict[PositionID, Char] = {}
+        # Char deletados, em ordem (só cresce): uma view sabe quais tombstones são
+        # posteriores a ela sem copiar os flags de todos os caracteres
+        self._tombstone_log: List[Char] = []
+
+    def __len__(self) -> int:
+        return len(self._chars)
+
+    def __iter__(self) -> Iterator[Char]:
+        return iter(self._chars)
+
+    def __getitem__(self, idx):
+        return self._chars[idx]
+
+    def insert(self, idx: int, char: Char):
+        self._chars.insert(idx, char)
+        self._by_id[char.id] = char
+
+    def id_at(self, idx: int) -> PositionID:
+        return self._chars[idx].id
+
+    def deleted_at(self, idx: int) -> bool:
+        return self._chars[idx].deleted
+
+    # `hint` (a posição do último acesso) acerta quando se digita ou apaga em
+    # sequência; fora dele, list.index varre a lista em C pelo Char, que não define
+    # __eq__ (compara por identidade) e, estando em _by_id, sempre é achado.
+    def index_of(self, pid: PositionID, hint: int = -1) -> int:
+        char = self._by_id.get(pid)
+        if char is None:
+            return -1
+        chars = self._chars
+        if 0 <= hint < len(chars) and chars[hint] is char:
+            return hint
+        return chars.index(char)
+
+    def is_deleted(self, pid: PositionID) -> bool:
+        return self._by_id[pid].deleted
+
+    def mark_deleted(self, pid: PositionID, hint: int = -1):
+        char = self._by_id[pid]
+        if not char.deleted:
+            # entra no log antes do flag mudar (ver _alive_flags)
+            self._tombstone_log.append(char)
+            char.deleted = True
+
+    # Operações em bloco
+    def visible_text(self) -> str:
+        return "".join([c.value for c in self._chars if not c.deleted])
+
+    def visible_ids(self) -> List[PositionID]:
+        return [c.id for c in self._chars if not c.deleted]
+
+    def visible_count(self, stop: Optional[int] = None) -> int:
+        return sum(1 for c in self._chars[:stop] if not c.deleted)
+
+    def tombstones(self) -> int:
+        return sum(1 for c in self._chars if c.deleted)
+
+    # Chamado com o lock do Node: copia só a lista de Char e o tamanho do log de
+    # tombstones; os flags da versão são reconstruídos depois, fora do lock
+    def freeze(self, version: int) -> ReplicaView:
+        chars = self._chars[:]
+        log, logged = self._tombstone_log, len(self._tombstone_log)
+        return ReplicaView(
+            version,
+            len(chars),
+            lambda: self._alive_flags(chars, log, logged),
+            lambda: list(map(attrgetter("value"), chars)),
+            lambda: list(map(attrgetter("id"), chars)),
+            lambda: list(map(attrgetter("parent"), chars)),
+            lambda: self._text_at(chars, log, logged),
+        )
+
+    # Texto direto dos Char enquanto nenhum deles foi deletado depois da view
+    # (None: os flags atuais já não valem e o texto sai das colunas)
+    @staticmethod
+    def _text_at(chars: List[Char], log: List[Char], logged: int) -> Optional[str]:
+        text = "".join([c.value for c in chars if not c.deleted])
+        return None if len(log) > logged else text
+
+    # Flags de `chars` como eram quando o log tinha `logged` entradas: os flags
+    # atuais, desfazendo os deletes registrados depois. Lê os flags antes do log:
+    # como mark_deleted registra antes de marcar, todo flag novo visto está no log.
+    @staticmethod
+    def _alive_flags(chars: List[Char], log: List[Char], logged: int) -> bytes:
+        alive = bytes(map(attrgetter("deleted"), chars)).translate(_FLIP)
+        later = log[logged:]
+        if not later:
+            return alive
+        # reaproveita os flags lidos antes do log: reler c.deleted aqui veria
+        # deletes feitos depois do slice, que não estão em `later`
+        later_ids = set(map(id, later))
+        return bytes(a or id(c) in later_ids for a, c in zip(alive, chars))
+
+    # Serializa as linhas [start, stop)
+    def snapshot(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        return [c.serialize() for c in self._chars[start:stop]]
+
+    # Linhas serializadas dos índices dados
+    def rows(self, indices: Iterable[int]) -> List[dict]:
+        chars = self._chars
+        return [chars[i].serialize() for i in indices]
+
+    # Índices, em ordem de documento, dos PositionID dados (instâncias canônicas):
+    # um único passe em C (set.__contains__ sobre os IDs), sem colunas auxiliares
+    def select(self, pids: Iterable[PositionID]) -> List[int]:
+        wanted = set(pids)
+        if not wanted:
+            return []
+        hits = map(wanted.__contains__, map(attrgetter("id"), self._chars))
+        return list(compress(range(len(self._chars)), hits))
+
+
+# Layout colunar: cada campo do Char vira uma coluna paralela. Os flags de
+# deleção ficam num bytearray (1 = visível), o que permite extrair o texto
+# visível e contar tombstones com operações em bloco, sem objetos Char.
+# Sites e contadores ficam em arrays tipados; o ID de cada posição é a referência
+# inteira (site << 40 | contador), e o parent é guardado da mesma forma (-1 =
+# início do documento). Os PositionID canônicos só existem em _by_ref.
+class ColumnarReplica:
+    _SITE_SHIFT = 40
+
+    def __init__(self):
+        self._values: List[str] = []
+        self._alive = bytearray()
+        self._sites = array("I")
+        self._counters = array("Q")
+        self._parents = array("q")
+
+        # tabela de sites e referência inteira -> PositionID (o Lamport dele ordena os irmãos)
+        self._site_names: List[str] = []
+        self._site_index: Dict[str, int] = {}
+        self._by_ref: Dict[int, PositionID] = {}
+        # última posição devolvida por index_of
+        self._last_hit = 0
+
+    def _site_idx(self, site: str) -> int:
+        idx = self._site_index.get(site)
+        if idx is None:
+            idx = len(self._site_names)
+            self._site_names.append(site)
+            self._site_index[site] = idx
+        return idx
+
+    def _ref(self, pid: Optional[PositionID]) -> int:
+        if pid is None:
+            return -1
+        return (self._site_idx(pid.site) << self._SITE_SHIFT) | pid.counter
+
+    # Referências dos IDs das colunas dadas, calculadas em C
+    @classmethod
+    def _id_refs(cls, sites: Iterable[int], counters: Iterable[int]) -> Iterator[int]:
+        return map(or_, map(lshift, sites, repeat(cls._SITE_SHIFT)), counters)
+
+    def _char(self, idx: int) -> Char:
+        parent_ref = self._parents[idx]
+        parent = self._by_ref.get(parent_ref) if parent_ref >= 0 else None
+        return Char(self._values[idx], self.id_at(idx), parent, not self._alive[idx])
+
+    def __len__(self) -> int:
+        return len(self._alive)
+
+    # Os Char devolvidos são cópias materializadas: alterá-los não altera a réplica
+    def __iter__(self) -> Iterator[Char]:
+        for idx in range(len(self._alive)):
+            yield self._char(idx)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._char(i) for i in range(*idx.indices(len(self._alive)))]
+        if idx < 0:
+            idx += len(self._alive)
+        return self._char(idx)
+
+    def insert(self, idx: int, char: Char):
+        pid = char.id
+        site_idx = self._site_idx(pid.site)
+        counter = pid.counter
+        self._values.insert(idx, char.value)
+        self._alive.insert(idx, 0 if char.deleted else 1)
+        self._sites.insert(idx, site_idx)
+        self._counters.insert(idx, counter)
+        self._parents.insert(idx, self._ref(char.parent))
+        self._by_ref[(site_idx << self._SITE_SHIFT) | counter] = pid
+
+    def id_at(self, idx: int) -> PositionID:
+        return self._by_ref[(self._sites[idx] << self._SITE_SHIFT) | self._counters[idx]]
+
+    def deleted_at(self, idx: int) -> bool:
+        return not self._alive[idx]
+
+    def index_of(self, pid: PositionID, hint: int = -1) -> int:
+        site_idx = self._site_index.get(pid.site)
+        if site_idx is None:
+            return -1
+        counter = pid.counter
+        sites, counters = self._sites, self._counters
+        size = len(counters)
+        # sem hint (is_deleted, mark_deleted), parte da última posição encontrada
+        if not 0 <= hint < size:
+            hint = self._last_hit if self._last_hit < size else 0
+        if size and counters[hint] == counter and sites[hint] == site_idx:
+            return hint
+        # busca o contador na coluna tipada (em C) e confirma pelo site, primeiro
+        # a partir de `hint` e depois do início
+        for lo, hi in ((hint, size), (0, hint)):
+            idx = lo - 1
+            while True:
+                try:
+                    idx = counters.index(counter, idx + 1, hi)
+                except ValueError:
+                    break
+                if sites[idx] == site_idx:
+                    self._last_hit = idx
+                    return idx
+        return -1
+
+    def is_deleted(self, pid: PositionID) -> bool:
+        return not self._alive[self.index_of(pid)]
+
+    def mark_deleted(self, pid: PositionID, hint: int = -1):
+        idx = self.index_of(pid, hint)
+        if idx >= 0:
+            self._alive[idx] = 0
+
+    # Operações em bloco
+    def visible_text(self) -> str:
+        return "".join(compress(self._values, self._alive))
+
+    def visible_ids(self) -> List[PositionID]:
+        refs = compress(self._id_refs(self._sites, self._counters), self._alive)
+        return list(map(self._by_ref.__getitem__, refs))
+
+    def visible_count(self, stop: Optional[int] = None) -> int:
+        return self._alive.count(1, 0, len(self._alive) if stop is None else stop)
+
+    def tombstones(self) -> int:
+        return len(self._alive) - self._alive.count(1)
+
+    # Chamado com o lock do Node: só cópias em bloco das colunas. IDs e parents são
+    # resolvidos depois pelas referências (_by_ref só ganha entradas, então pode
+    # ser consultado fora do lock)
+    def freeze(self, version: int) -> ReplicaView:
+        by_ref = self._by_ref
+        sites, counters, refs = self._sites[:], self._counters[:], self._parents[:]
+        return ReplicaView(
+            version,
+            len(refs),
+            bytes(self._alive),
+            self._values[:],
+            lambda: list(map(by_ref.__getitem__, self._id_refs(sites, counters))),
+            lambda: [by_ref[r] if r >= 0 else None for r in refs],
+        )
+
+    def snapshot(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        cols = slice(start, stop)
+        return self._encode(
+            self._values[cols], self._alive[cols], self._sites[cols], self._counters[cols], self._parents[cols]
+        )
+
+    # Linhas serializadas dos índices dados
+    def rows(self, indices: Iterable[int]) -> List[dict]:
+        indices = list(indices)
+        return self._encode(
+            *(list(map(col.__getitem__, indices)) for col in (
+                self._values, self._alive, self._sites, self._counters, self._parents
+            ))
+        )
+
+    # Monta as linhas coluna a coluna: os IDs saem das referências (um serialize por
+    # linha) e o parent, quase sempre um caractere da mesma faixa, reaproveita o ID
+    # já serializado; só os parents de fora da faixa são serializados à parte.
+    def _encode(self, values, alive, sites, counters, parents) -> List[dict]:
+        by_ref = self._by_ref
+        refs = list(self._id_refs(sites, counters))
+        ids = list(map(PositionID.serialize, map(by_ref.__getitem__, refs)))
+        parent_ids = list(map(dict(zip(refs, ids)).get, parents))
+        for i in compress(range(len(parent_ids)), map(not_, parent_ids)):
+            if parents[i] >= 0:
+                parent_ids[i] = by_ref[parents[i]].serialize()
+        return [
+            {"value": v, "id": pid, "parent": parent, "deleted": deleted}
+            for v, pid, parent, deleted in zip(values, ids, parent_ids, map(not_, alive))
+        ]
+
+    # Índices, em ordem de documento, dos PositionID dados: um passe em C pelas
+    # referências, comparadas com as dos IDs pedidos
+    def select(self, pids: Iterable[PositionID]) -> List[int]:
+        site_index, shift = self._site_index, self._SITE_SHIFT
+        wanted = {(site_index[pid.site] << shift) | pid.counter for pid in pids if pid.site in site_index}
+        if not wanted:
+            return []
+        hits = map(wanted.__contains__, self._id_refs(self._sites, self._counters))
+        return list(compress(range(len(self._alive)), hits))
@@ -0,0 +1,323 @@
+"""
+Rede simulada, em memória e determinística, para experimentos com muitos sites.
+
+Todos os eventos (entregas de mensagens, conexões, operações agendadas) rodam
+numa fila ordenada por um relógio virtual, com sorteios feitos por um
+random.Random com semente: a mesma semente reproduz a mesma execução.
+
+Uso:
+    python -m sim --sites 100 --ops 1000 --seed 1 --loss 0.01 --partitions 2
+"""
+import argparse
+import heapq
+import json
+import random
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from transport import Transport
+
+
+# Uma ponta de uma conexão simulada; `peer` é a ponta do outro lado
+class SimLink:
+    def __init__(self, owner: "SimTransport", remote_addr: str):
+        self.owner = owner
+        self.remote_addr = remote_addr
+        self.peer: Optional["SimLink"] = None
+        self.closed = False
+        # instante da última entrega agendada (para manter FIFO sem reordenação)
+        self.last_delivery = 0.0
+
+
+class SimNetwork:
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: Tuple[float, float] = (0.001, 0.010),
+        reorder: bool = True,
+        duplicate: float = 0.0,
+        loss: float = 0.0,
+    ):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.loss = loss
+        self.now = 0.0
+        self.endpoints: Dict[str, "SimTransport"] = {}
+        self.stats = {"sent": 0, "delivered": 0, "dropped": 0, "duplicated": 0, "events": 0}
+        self._queue: List[tuple] = []
+        # id(payload) -> [mensagem decodificada, entregas pendentes]: um broadcast manda
+        # o mesmo payload para todos os peers e é decodificado uma vez só (os nós
+        # apenas leem as mensagens recebidas)
+        self._decoded: Dict[int, list] = {}
+        self._seq = 0
+        # addr -> grupo da partição atual (None = rede inteira conectada)
+        self._groups: Optional[Dict[str, int]] = None
+
+    def transport(self, addr: str, peers: List[str]) -> "SimTransport":
+        return SimTransport(self, addr, peers)
+
+    @property
+    def nodes(self):
+        return [ep.node for ep in self.endpoints.values()]
+
+    # Fila de eventos
+    def schedule(self, delay: float, fn: Callable, *args):
+        self._seq += 1
+        heapq.heappush(self._queue, (self.now + delay, self._seq, fn, args))
+
+    def run(self, until: Optional[float] = None, max_events: Optional[int] = None) -> int:
+        processed = 0
+        while self._queue:
+            if until is not None and self._queue[0][0] > until:
+                break
+            if max_events is not None and processed >= max_events:
+                break
+            t, _, fn, args = heapq.heappop(self._queue)
+            self.now = max(self.now, t)
+            fn(*args)
+            processed += 1
+        if until is not None:
+            self.now = max(self.now, until)
+        self.stats["events"] += processed
+        return processed
+
+    # Falhas
+    def reachable(self, a: str, b: str) -> bool:
+        return self._groups is None or self._groups.get(a) == self._groups.get(b)
+
+    # Divide a rede nos grupos dados; conexões entre grupos caem na hora.
+    # Endereços fora de todos os grupos ficam num grupo próprio.
+    def partition(self, *groups: List[str]):
+        self._groups = {}
+        for gid, group in enumerate(groups):
+            for addr in group:
+                self._groups[addr] = gid
+        for addr in self.endpoints:
+            self._groups.setdefault(addr, -1)
+        for ep in list(self.endpoints.values()):
+            for link in list(ep.links):
+                if not self.reachable(ep.addr, link.remote_addr):
+                    self._close(link)
+
+    # Desfaz a partição e reconecta quem tinha ficado isolado
+    def heal(self):
+        self._groups = None
+        for ep in list(self.endpoints.values()):
+            self.schedule(0.0, ep.dial)
+
+    # Desliga as falhas, religa quem estava desconectado e roda até a fila esvaziar.
+    # Se ainda houver divergência (mensagens perdidas em conexões que não caíram),
+    # derruba e refaz todas as conexões: cada reconexão pede delta ao peer.
+    def settle(self):
+        self.loss = 0.0
+        self.duplicate = 0.0
+        self._groups = None
+        for ep in list(self.endpoints.values()):
+            self.schedule(0.0, ep.dial)
+        self.run()
+        if self.converged():
+            return
+        for ep in list(self.endpoints.values()):
+            for link in list(ep.links):
+                self._close(link)
+        for ep in list(self.endpoints.values()):
+            self.schedule(0.0, ep.dial)
+        self.run()
+
+    def converged(self) -> bool:
+        return len({n.state_hash() for n in self.nodes}) == 1
+
+    # Conexões
+    def _open(self, dialer: "SimTransport", acceptor: "SimTransport") -> SimLink:
+        out = SimLink(dialer, acceptor.addr)
+        inc = SimLink(acceptor, dialer.addr)
+        out.peer, inc.peer = inc, out
+        dialer.links.append(out)
+        acceptor.links.append(inc)
+        return out
+
+    def _close(self, link: SimLink):
+        for end in (link, link.peer):
+            if end.closed:
+                continue
+            end.closed = True
+            end.owner.links.remove(end)
+            end.owner.node._on_conn_closed(end, end.remote_addr)
+
+    # Mensagens
+    def _transmit(self, link: SimLink, payload: bytes):
+        self.stats["sent"] += 1
+        rng = self.rng
+        if self.loss and rng.random() < self.loss:
+            self.stats["dropped"] += 1
+            return
+        copies = 1
+        if self.duplicate and rng.random() < self.duplicate:
+            copies = 2
+            self.stats["duplicated"] += 1
+        entry = self._decoded.setdefault(id(payload), [None, 0])
+        entry[1] += copies
+        for _ in range(copies):
+            at = self.now + rng.uniform(*self.latency)
+            if not self.reorder:
+                at = max(at, link.last_delivery)
+                link.last_delivery = at
+            self.schedule(at - self.now, self._deliver, link.peer, payload)
+
+    def _deliver(self, link: SimLink, payload: bytes):
+        entry = self._decoded[id(payload)]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._decoded[id(payload)]
+        if link.closed:
+            self.stats["dropped"] += 1
+            return
+        self.stats["delivered"] += 1
+        node = link.owner.node
+        node._on_bytes(link, len(payload), False)
+        try:
+            if entry[0] is None:
+                entry[0] = json.loads(payload)
+            node._on_message(entry[0], link, link.remote_addr, len(payload))
+        except Exception:
+            traceback.print_exc()
+
+
+# Transporte de um site na rede simulada: sem sockets nem threads
+class SimTransport(Transport):
+    def __init__(self, network: SimNetwork, addr: str, peers: List[str]):
+        self.network = network
+        self.addr = addr
+        self.peers = peers
+        self.node = None
+        self.links: List[SimLink] = []
+
+    def start(self, node):
+        self.node = node
+        net = self.network
+        net.endpoints[self.addr] = self
+        net.schedule(0.0, self.dial)
+        # sites que já existiam e nos têm como peer conectam em nós também
+        for ep in list(net.endpoints.values()):
+            if ep is not self and self.addr in ep.peers:
+                net.schedule(0.0, ep.dial)
+
+    # Abre conexões de saída para os peers alcançáveis que ainda não estão conectados
+    def dial(self):
+        net = self.network
+        node = self.node
+        if net.endpoints.get(self.addr) is not self:
+            return
+        for peer in self.peers:
+            if peer in node.peer_sockets:
+                continue
+            remote = net.endpoints.get(peer)
+            if remote is None or not net.reachable(self.addr, peer):
+                continue
+            link = net._open(self, remote)
+            node._on_peer_connected(peer, link)
+
+    def send(self, conn: SimLink, payload: bytes):
+        if conn.closed:
+            raise ConnectionError(f"link {self.addr} -> {conn.remote_addr} fechado")
+        self.network._transmit(conn, payload)
+        self.node._on_bytes(conn, len(payload), True)
+
+    def stop(self):
+        for link in list(self.links):
+            self.network._close(link)
+        self.network.endpoints.pop(self.addr, None)
+
+    def now(self) -> float:
+        return self.network.now
+
+
+def build_cluster(network: SimNetwork, sites: int, columnar: bool = False):
+    from node import Node
+
+    addrs = [f"sim:{i + 1}" for i in range(sites)]
+    return [
+        Node(
+            str(i + 1),
+            "sim",
+            i + 1,
+            [],
+            columnar=columnar,
+            export=False,
+            transport=network.transport(addr, [a for a in addrs if a != addr]),
+        )
+        for i, addr in enumerate(addrs)
+    ]
+
+
+# Agenda `ops` edições aleatórias (70% inserts) espalhadas em `duration` segundos virtuais
+def random_workload(network: SimNetwork, nodes, ops: int, duration: float, seed: int):
+    rng = random.Random(seed)
+
+    def edit(node, r):
+        size = node.replica.visible_count()
+        if size and r.random() < 0.3:
+            node.delete(r.randrange(size))
+        else:
+            node.insert(chr(97 + r.randrange(26)), r.randint(0, size))
+
+    for _ in range(ops):
+        node = nodes[rng.randrange(len(nodes))]
+        network.schedule(rng.uniform(0, duration), edit, node, random.Random(rng.random()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sites", type=int, default=100)
+    parser.add_argument("--ops", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos virtuais da carga")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.001, 0.050))
+    parser.add_argument("--fifo", action="store_true", help="sem reordenação por conexão")
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--partitions", type=int, default=0, help="partições aleatórias durante a carga")
+    parser.add_argument("--columnar", action="store_true")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    net = SimNetwork(args.seed, tuple(args.latency), not args.fifo, args.duplicate, args.loss)
+    nodes = build_cluster(net, args.sites, args.columnar)
+    net.run()
+    random_workload(net, nodes, args.ops, args.duration, args.seed)
+
+    rng = random.Random(args.seed)
+    addrs = list(net.endpoints)
+    for _ in range(args.partitions):
+        start = rng.uniform(0, args.duration)
+        side = rng.sample(addrs, len(addrs) // 2)
+        net.schedule(start, net.partition, side)
+        net.schedule(start + rng.uniform(0.1, args.duration / 4), net.heal)
+
+    net.run()
+    net.settle()
+    wall = time.perf_counter() - t0
+
+    print(
+        json.dumps(
+            {
+                "sites": args.sites,
+                "ops": args.ops,
+                "seed": args.seed,
+                "virtual_seconds": net.now,
+                "wall_seconds": wall,
+                "network": net.stats,
+                "converged": net.converged(),
+                "chars": nodes[0].replica.visible_count(),
+                "state_hash": nodes[0].state_hash(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import dataclasses
+
+from node import Node
+from utils import Char, PositionID, VectorClock
+
+
+def test_position_id_is_slotted_and_frozen():
+    """
+    Cenário de teste:
+      - PositionID, VectorClock e Char não têm __dict__.
+      - PositionID não aceita atribuição depois de criado.
+    """
+    pid = PositionID("1", 1, 1)
+    char = Char("a", pid)
+    for obj in (pid, VectorClock({"1": 1}), char):
+        assert not hasattr(obj, "__dict__")
+    try:
+        pid.site = "2"
+        assert False, "PositionID deveria ser imutável"
+    except dataclasses.FrozenInstanceError:
+        pass
+
+
+def test_deserialize_reuses_known_instances():
+    """
+    Cenário de teste:
+      - Um PositionID serializado é desserializado com e sem a tabela de conhecidos.
+      - Um Char serializado reaproveita os PositionID do id e do parent.
+    Esperado: com a tabela, a instância devolvida é a mesma; sem ela, uma cópia.
+    Na forma serializada o relógio só tem a entrada do próprio site.
+    """
+    parent = PositionID("1", 1, 1)
+    pid = PositionID("1", 2, 2)
+    known = {parent.key(): parent, pid.key(): pid}
+
+    assert PositionID.deserialize(pid.serialize(), known) is pid
+    assert PositionID.deserialize(pid.serialize()) is not pid
+    assert PositionID.deserialize(pid.serialize()).key() == pid.key()
+    assert pid.serialize() == {"vclock": {"1": 2}, "site": "1", "lamport": 2}
+
+    char = Char.deserialize(Char("b", pid, parent).serialize(), known)
+    assert char.id is pid and char.parent is parent
+
+
+def test_replica_parents_are_canonical():
+    """
+    Cenário de teste:
+      - Um nó recebe inserts remotos de dois sites diferentes, encadeados.
+    Esperado: o parent de cada Char é o mesmo objeto que o id do Char anterior
+    na réplica, os nomes de site são compartilhados entre os IDs e o Lamport de
+    IDs com o relógio completo é a soma do relógio.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    try:
+        parent = None
+        for i, site in enumerate(["site-a", "site-b", "site-a"]):
+            # "".join cria um objeto str novo, como o json.loads faria a cada mensagem
+            op_id = {"vclock": {"".join("site-a"): i + 1, "site-b": i + 1}, "site": "".join(site)}
+            n1.merge({"type": "insert", "site_id": site, "pos_id": parent, "char": "xyz"[i], "op_id": op_id})
+            parent = op_id
+
+        chars = list(n1.replica)
+        assert n1.visible_text() == "xyz"
+        assert chars[1].parent is chars[0].id
+        assert chars[2].parent is chars[1].id
+        assert chars[0].id.site is chars[2].id.site
+        assert [c.id.lamport for c in chars] == [2, 4, 6]
+        assert [c.id.counter for c in chars] == [1, 2, 3]
+    finally:
+        n1.stop()
+
+
+def test_local_ids_follow_the_lamport_clock():
+    """
+    Cenário de teste:
+      - Site 1 recebe um insert de site 2 com Lamport 50 (no formato da rede, com
+        o relógio só com a entrada do próprio site) e digita logo depois dele.
+      - Um insert concorrente de site 3 com Lamport menor chega no mesmo parent.
+    Esperado: o ID local tem contador 1 e Lamport 51 (maior que o do parent); o
+    relógio do nó só tem os contadores de cada site; o irmão mais antigo fica
+    depois da subárvore local.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    try:
+        remote = {"vclock": {"2": 7}, "site": "2", "lamport": 50}
+        n1.merge({"type": "insert", "site_id": "2", "pos_id": None, "char": "a", "op_id": remote})
+        cur = n1.cursor()
+        cur.insert("b")
+        assert (cur.anchor.counter, cur.anchor.lamport) == (1, 51)
+        assert n1.vclock.v == {"2": 7, "1": 1}
+
+        late = {"vclock": {"3": 1}, "site": "3", "lamport": 20}
+        n1.merge({"type": "insert", "site_id": "3", "pos_id": remote, "char": "c", "op_id": late})
+        assert n1.visible_text() == "abc"
+    finally:
+        n1.stop()
+
+
+if __name__ == "__main__":
+    test_position_id_is_slotted_and_frozen()
+    test_deserialize_reuses_known_instances()
+    test_replica_parents_are_canonical()
+    test_local_ids_follow_the_lamport_clock()
@@ -0,0 +1,89 @@
+import os
+import pstats
+import tempfile
+import threading
+import tracemalloc
+
+from metrics import Metrics
+from node import Node
+from utils import PositionID
+
+
+def remote_op(counter, parent):
+    pid = PositionID("2", counter, counter)
+    return {
+        "type": "insert",
+        "site_id": "2",
+        "pos_id": parent.serialize() if parent else None,
+        "char": "r",
+        "op_id": pid.serialize(),
+    }, pid
+
+
+def test_profile_start_dump_stop():
+    """
+    Cenário de teste:
+      - Com métricas ligadas, o profiling é ligado e o nó recebe edições locais
+        e operações "remotas" vindas de outra thread (como as de rede).
+      - O perfil é gravado em arquivo e o profiling é desligado.
+    Esperado: o arquivo é lido pelo pstats e contém o merge; depois do stop os
+    métodos voltam a ser os de antes (inclusive os embrulhados pelo Metrics).
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], metrics=Metrics(), export=False)
+    try:
+        before = {m: n1.__dict__.get(m) for m in ("merge", "_on_message", "_broadcast")}
+        n1.profile_start()
+        assert n1.merge is not before["merge"]
+
+        n1.cursor().insert("abc")
+
+        def network_thread():
+            parent = None
+            for i in range(1, 50):
+                op, parent = remote_op(i, parent)
+                n1._on_message(op, None, "127.0.0.1:5012", 0)
+
+        t = threading.Thread(target=network_thread, name="rede")
+        t.start()
+        t.join()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path, summary = n1.profile_dump(os.path.join(tmpdir, "n1.prof"))
+            assert os.path.exists(path)
+            funcs = {name for (_, _, name) in pstats.Stats(path).stats}
+            assert "merge" in funcs and "_merge_insert" in funcs
+            assert "merge" in summary
+
+        n1.profile_stop()
+        assert {m: n1.__dict__.get(m) for m in before} == before
+        assert n1.visible_text().count("r") == 49
+    finally:
+        n1.stop()
+
+
+def test_memprofile_snapshot_file():
+    """
+    Cenário de teste:
+      - memprofile liga o tracemalloc; após novas edições, grava um snapshot.
+    Esperado: o snapshot é carregável e memprofile_stop desliga o tracemalloc.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    try:
+        path, summary = n1.memprofile()
+        assert path is None and tracemalloc.is_tracing()
+
+        n1.cursor().insert("x" * 500)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path, summary = n1.memprofile(os.path.join(tmpdir, "n1.tracemalloc"))
+            assert tracemalloc.Snapshot.load(path).traces
+            assert "500 caracteres" in summary
+
+        n1.memprofile_stop()
+        assert not tracemalloc.is_tracing()
+    finally:
+        n1.stop()
+
+
+if __name__ == "__main__":
+    test_profile_start_dump_stop()
+    test_memprofile_snapshot_file()
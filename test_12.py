@@ -0,0 +1,183 @@
+import os
+import random
+import tempfile
+
+import ingest
+from node import Node
+from utils import PositionID
+
+
+def build_node(**kwargs):
+    return Node("1", "127.0.0.1", 5011, [], export=False, **kwargs)
+
+
+def apply_opcodes(a, opcodes, b):
+    """
+    Reconstrói `b` aplicando os opcodes (de trás para a frente) sobre `a`.
+    """
+    out = a
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        out = out[:i1] + b[j1:j2] + out[i2:]
+    return out
+
+
+def test_diff_small_and_large_edits():
+    """
+    Cenário de teste:
+      - Edições pequenas num texto grande (caminho de prefixo/sufixo comuns).
+      - Muitas edições espalhadas num texto maior que CHAR_DIFF_LIMIT (diff por linhas).
+    Esperado: os opcodes reconstroem o texto novo; a edição pequena vira um único opcode.
+    """
+    rng = random.Random(3)
+    base = "".join(f"linha {i} " + "abcdefghij"[i % 10] * 30 + "\n" for i in range(5000))
+
+    small = base[:70000] + "XYZ" + base[70000:]
+    ops = ingest.diff(base, small)
+    assert ops == [("insert", 70000, 70000, 70000, 70003)]
+
+    lines = base.splitlines(keepends=True)
+    for _ in range(50):
+        i = rng.randrange(len(lines))
+        lines[i] = lines[i].replace("a", "A", 1) if rng.random() < 0.5 else ""
+    big = "".join(lines)
+    ops = ingest.diff(base, big)
+    assert apply_opcodes(base, ops, big) == big
+    assert len(ops) <= 50
+
+    assert ingest.diff(base, base) == []
+
+
+def test_ingest_keeps_ids_of_unchanged_text():
+    """
+    Cenário de teste:
+      - Um arquivo é carregado num nó vazio e depois editado no meio.
+    Esperado: só o trecho alterado vira operações; os caracteres mantidos
+    conservam seus IDs.
+    """
+    n1 = build_node()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "doc.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("hello world\n" * 1000)
+            stats = n1.load_file(path)
+        assert stats == {"inserts": 1, "chars_inserted": 12000, "deletes": 0, "chars_deleted": 0}
+        assert n1.visible_text() == "hello world\n" * 1000
+
+        ids = n1.replica.visible_ids()
+        new_text = "hello world\n" * 500 + "hello there\n" + "hello world\n" * 499
+        stats = n1.ingest_text(new_text)
+        assert n1.visible_text() == new_text
+        assert stats["chars_inserted"] + stats["chars_deleted"] <= 10
+        after = n1.replica.visible_ids()
+        assert after[:6006] == ids[:6006] and after[-5989:] == ids[-5989:]
+    finally:
+        n1.stop()
+
+
+def test_watch_preserves_remote_edits():
+    """
+    Cenário de teste:
+      - O nó observa um arquivo com o texto "abc".
+      - Chega um insert remoto ("!" no início) que o arquivo não tem.
+      - O arquivo é editado externamente para "abXc".
+    Esperado: o resultado é "!abXc" (a edição remota não é apagada), e um
+    novo poll sem mudança no arquivo não faz nada.
+    """
+    n1 = build_node()
+    try:
+        n1.ingest_text("abc")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "doc.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("abc")
+            watcher = ingest.FileWatcher(n1, path, interval=60)
+            assert watcher.poll() is None
+
+            pid = PositionID("2", 1, 1)
+            n1.merge({"type": "insert", "site_id": "2", "pos_id": None, "char": "!", "op_id": pid.serialize()})
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("abXc")
+            os.utime(path, ns=(1, 1))
+            stats = watcher.poll()
+            assert stats["chars_inserted"] == 1 and stats["chars_deleted"] == 0
+            assert n1.visible_text() == "!abXc"
+            assert watcher.poll() is None
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("bXc")
+            os.utime(path, ns=(2, 2))
+            watcher.poll()
+            assert n1.visible_text() == "!bXc"
+    finally:
+        n1.stop()
+
+
+def test_watch_ignores_own_export():
+    """
+    Cenário de teste:
+      - O nó exporta para site_<id>.txt e observa esse mesmo arquivo.
+    Esperado: as escritas do próprio nó não geram operações; uma edição
+    externa do arquivo é ingerida.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        n1 = Node("1", "127.0.0.1", 5011, [])
+        try:
+            watcher = n1.watch(interval=60)
+            n1.cursor().insert("abc")
+            assert watcher.poll() is None
+            clock = dict(n1.vclock.v)
+
+            with open("site_1.txt", "w", encoding="utf-8") as f:
+                f.write("abcd")
+            os.utime("site_1.txt", ns=(1, 1))
+            watcher.poll()
+            assert n1.visible_text() == "abcd"
+            assert n1.vclock.v["1"] == clock["1"] + 1
+            assert watcher.poll() is None
+        finally:
+            n1.stop()
+            os.chdir(cwd)
+
+
+def test_export_ingests_pending_external_edit():
+    """
+    Cenário de teste:
+      - O nó exporta para site_<id>.txt e observa esse mesmo arquivo.
+      - O usuário salva "abcUSER" e, antes do próximo poll, chega um insert
+        remoto (que exporta o arquivo de novo).
+    Esperado: a edição do usuário é ingerida antes de o arquivo ser
+    sobrescrito; o texto e o arquivo ficam com as duas edições.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        n1 = Node("1", "127.0.0.1", 5011, [])
+        try:
+            watcher = n1.watch(interval=60)
+            n1.cursor().insert("abc")
+
+            with open("site_1.txt", "w", encoding="utf-8") as f:
+                f.write("abcUSER")
+            os.utime("site_1.txt", ns=(1, 1))
+            pid = PositionID("2", 1, 1)
+            n1.merge({"type": "insert", "site_id": "2", "pos_id": None, "char": "!", "op_id": pid.serialize()})
+
+            assert n1.visible_text() == "!abcUSER"
+            with open("site_1.txt", encoding="utf-8") as f:
+                assert f.read() == "!abcUSER"
+            assert watcher.poll() is None
+        finally:
+            n1.stop()
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_diff_small_and_large_edits()
+    test_ingest_keeps_ids_of_unchanged_text()
+    test_watch_preserves_remote_edits()
+    test_watch_ignores_own_export()
+    test_export_ingests_pending_external_edit()
@@ -0,0 +1,145 @@
+import threading
+
+from node import Node
+from utils import PositionID
+
+
+def remote_insert(site, counter, parent, char="r"):
+    pid = PositionID(site, counter, counter)
+    return {
+        "type": "insert",
+        "site_id": site,
+        "pos_id": parent.serialize() if parent else None,
+        "char": char,
+        "op_id": pid.serialize(),
+    }, pid
+
+
+def test_view_is_frozen_and_cached():
+    """
+    Cenário de teste:
+      - Nas duas réplicas (lista e colunar), uma view é tirada de "hello world".
+      - Depois chegam um insert remoto e deletes.
+    Esperado: as views antigas continuam com o texto, os IDs, os tombstones e
+    o snapshot da versão em que foram tiradas (mesmo lidos depois dos deletes);
+    sem mudanças, view() devolve o mesmo objeto; a view nova bate com a réplica.
+    """
+    for columnar in (False, True):
+        n1 = Node("1", "127.0.0.1", 5011, [], columnar=columnar, export=False)
+        try:
+            n1.cursor().insert("hello world")
+            old = n1.view()
+            assert n1.view() is old
+            assert old.visible_text() == "hello world" == n1.visible_text()
+            old_ids = n1.replica.visible_ids()
+            old_snapshot = n1.replica.snapshot()
+
+            op, _ = remote_insert("2", 1, None, "!")
+            n1.merge(op)
+            mid = n1.view()
+            n1.delete(0)
+            n1.delete(5)
+            new = n1.view()
+            # texto lido só depois dos deletes
+            assert mid.visible_text() == "!hello world"
+            assert new is not old and new.version > old.version
+
+            assert old.visible_text() == "hello world"
+            assert old.visible_ids() == old_ids
+            assert old.snapshot() == old_snapshot and old.tombstones() == 0
+            assert new.visible_text() == "helloworld" == n1.replica.visible_text()
+            assert new.snapshot() == n1.replica.snapshot()
+            assert new.snapshot(2, 5) == n1.replica.snapshot(2, 5)
+            assert new.tombstones() == n1.replica.tombstones() == 2
+            assert new.visible_count(4) == n1.replica.visible_count(4)
+            assert [c.serialize() for c in new] == n1.replica.snapshot()
+        finally:
+            n1.stop()
+
+
+class HookedLog(list):
+    """
+    Log de tombstones que roda `hook` logo depois do primeiro slice (simula um
+    delete chegando no meio da leitura de uma view).
+    """
+
+    hook = None
+
+    def __getitem__(self, item):
+        out = super().__getitem__(item)
+        if isinstance(item, slice) and self.hook is not None:
+            hook, self.hook = self.hook, None
+            hook()
+        return out
+
+
+def test_list_view_ignores_delete_during_read():
+    """
+    Cenário de teste:
+      - Réplica em lista com "abcdef"; uma view é tirada.
+      - Um delete acontece antes da leitura e outro no meio dela (logo depois
+        de a view consultar o log de tombstones).
+    Esperado: a view continua mostrando "abcdef".
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    try:
+        n1.cursor().insert("abcdef")
+        n1.replica._tombstone_log = log = HookedLog()
+        view = n1.view()
+        n1.delete(0)
+        log.hook = lambda: n1.delete(2)
+        assert view.alive == b"\x01" * 6
+        assert view.visible_text() == "abcdef"
+        assert n1.visible_text() == "bcef"
+    finally:
+        n1.stop()
+
+
+def test_views_consistent_under_concurrent_merges():
+    """
+    Cenário de teste:
+      - Uma thread aplica inserts remotos no fim do texto e deleta o primeiro
+        caractere visível a cada 10 inserts, enquanto leitores tiram views.
+    Esperado: toda view lida é um estado que existiu (os deletes sempre tiram
+    o primeiro caractere visível e os inserts vão para o fim) e sua contagem de
+    tombstones bate com o texto.
+    """
+    for columnar in (False, True):
+        n1 = Node("1", "127.0.0.1", 5011, [], columnar=columnar, export=False)
+        try:
+            n1.cursor().insert("b" * 200)
+            parent = n1.replica.id_at(len(n1.replica) - 1)
+            done = threading.Event()
+            errors = []
+
+            def reader():
+                while not done.is_set():
+                    view = n1.view()
+                    text = view.visible_text()
+                    deleted = view.tombstones()
+                    inserted = len(view) - 200
+                    if text != ("b" * 200 + "w" * inserted)[deleted:]:
+                        errors.append((deleted, inserted, text))
+
+            readers = [threading.Thread(target=reader) for _ in range(3)]
+            for t in readers:
+                t.start()
+            for i in range(1, 301):
+                op, parent = remote_insert("2", i, parent, "w")
+                n1.merge(op)
+                if i % 10 == 0:
+                    n1.delete(0)
+            done.set()
+            for t in readers:
+                t.join()
+
+            assert not errors, errors[:1]
+            assert n1.visible_text() == ("b" * 200 + "w" * 300)[30:]
+        finally:
+            n1.stop()
+
+
+if __name__ == "__main__":
+    test_view_is_frozen_and_cached()
+    test_list_view_ignores_delete_during_read()
+    test_views_consistent_under_concurrent_merges()
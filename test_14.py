@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def run_main(args, cwd, summary, stdin=False):
+    return subprocess.Popen(
+        [sys.executable, MAIN, "--summary", os.path.join(cwd, summary)] + args,
+        cwd=cwd,
+        stdin=subprocess.PIPE if stdin else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def read_summary(cwd, summary):
+    with open(os.path.join(cwd, summary), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_headless_script_from_stdin():
+    """
+    Cenário de teste:
+      - main.py sobe sem prompt, com a topologia lida de um arquivo de config
+        (peer inexistente), e executa comandos vindos do stdin, inclusive um
+        inválido e um comentário.
+    Esperado: o resumo JSON conta as edições e o erro e o texto exportado é o
+    esperado; a réplica local assenta, mas como o peer configurado nunca
+    respondeu, o nó não se declara convergido e sai com código 2.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = os.path.join(tmpdir, "nodes.json")
+        with open(config, "w", encoding="utf-8") as f:
+            json.dump({"1": {"host": "127.0.0.1", "port": 5011, "peers": [["127.0.0.1", 5019]]}}, f)
+        args = ["--site", "1", "--config", config, "--script", "-", "--settle", "0.2", "--timeout", "1"]
+        proc = run_main(args, tmpdir, "s1.json", stdin=True)
+        script = "insert 0 a\ninsert 1 b\n# comentário\ninsert 2 c\ndelete 1\ninsert x y\ninsert 2 d\n"
+        out, err = proc.communicate(script, 60)
+        assert proc.returncode == 2, err
+        summary = read_summary(tmpdir, "s1.json")
+        assert summary["ops"] == 5 and summary["errors"] == 1
+        assert summary["chars"] == 3 and summary["tombstones"] == 1
+        assert summary["settled"] and not summary["converged"]
+        assert summary["applied"] == {"1": 5} and summary["peers_connected"] == []
+        assert '"state_hash"' in out
+        with open(os.path.join(tmpdir, "site_1.txt"), encoding="utf-8") as f:
+            assert f.read() == "acd"
+
+
+def test_headless_workloads_converge():
+    """
+    Cenário de teste:
+      - Dois processos headless conectados entre si: um gera carga aleatória a
+        500 ops/s e o outro digita em sequência o mais rápido possível.
+    Esperado: os dois resumos têm 300 operações, os dois contadores completos,
+    se declaram convergidos um com o outro e têm o mesmo hash de estado.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        common = ["--ops", "300", "--wait-peers", "1", "--no-export"]
+        p1 = run_main(
+            ["--site", "1", "--port", "5011", "--peer", "127.0.0.1:5012", "--workload", "random", "--rate", "500"]
+            + common,
+            tmpdir,
+            "s1.json",
+        )
+        p2 = run_main(
+            ["--site", "2", "--port", "5012", "--peer", "127.0.0.1:5011", "--workload", "sequential"] + common,
+            tmpdir,
+            "s2.json",
+        )
+        for p in (p1, p2):
+            p.communicate(timeout=120)
+        assert p1.returncode == p2.returncode == 0
+        s1, s2 = read_summary(tmpdir, "s1.json"), read_summary(tmpdir, "s2.json")
+        assert s1["ops"] == s2["ops"] == 300
+        assert s1["applied"] == s2["applied"] == {"1": 300, "2": 300}
+        assert s1["converged"] and s2["converged"]
+        assert s1["peers_converged"] == ["2"] and s2["peers_converged"] == ["1"]
+        assert s1["state_hash"] == s2["state_hash"]
+
+
+if __name__ == "__main__":
+    test_headless_script_from_stdin()
+    test_headless_workloads_converge()
@@ -0,0 +1,108 @@
+from node import Node
+from utils import PositionID
+
+
+def build_node():
+    """
+    Cria um único nó, sem peers, para exercitar a API ancorada por ID.
+    """
+    return Node("1", "127.0.0.1", 5011, [])
+
+
+def remote_insert(node, site, counter, char, parent):
+    """
+    Aplica diretamente um insert "remoto" vindo de outro site.
+    """
+    pid = PositionID(site, counter, counter)
+    node.merge(
+        {
+            "type": "insert",
+            "site_id": site,
+            "pos_id": parent.serialize() if parent else None,
+            "char": char,
+            "op_id": pid.serialize(),
+        }
+    )
+    return pid
+
+
+def test_cursor_typing_and_remote_edits():
+    """
+    Cenário de teste:
+      - Um cursor digita "Hello" no fim do documento.
+      - Um site remoto insere "> " no início.
+      - O cursor continua ancorado e digita " World", sem resolver índices.
+      - Um backspace apaga o último caractere digitado.
+    Esperado: "> Hello Worl", com o cursor no fim do texto.
+    """
+    n1 = build_node()
+    try:
+        cur = n1.cursor()
+        cur.insert("Hello")
+        assert n1.visible_text() == "Hello"
+        assert cur.index() == 5
+
+        gt = remote_insert(n1, "9", 1, ">", None)
+        remote_insert(n1, "9", 2, " ", gt)
+        assert n1.visible_text() == "> Hello"
+        assert cur.index() == 7
+
+        cur.insert(" World")
+        cur.delete_backward()
+        assert n1.visible_text() == "> Hello Worl"
+        assert cur.index() == len("> Hello Worl")
+    finally:
+        n1.stop()
+
+
+def test_backspace_keeps_position_shortcut():
+    """
+    Cenário de teste:
+      - Nas duas réplicas, um cursor no meio de um texto longo dá backspaces seguidos.
+    Esperado: o texto perde os caracteres à esquerda do cursor e, depois de cada
+    backspace, o atalho de posição (_last_idx) aponta para a nova âncora, então o
+    próximo backspace não varre a réplica.
+    """
+    for columnar in (False, True):
+        n1 = Node("1", "127.0.0.1", 5011, [], columnar=columnar, export=False)
+        try:
+            n1.cursor().insert("abcdefghij" * 100)
+            cur = n1.cursor(500)
+            for _ in range(3):
+                cur.delete_backward()
+                assert n1.replica.id_at(n1._last_idx) is cur.anchor
+            assert n1.visible_text() == ("abcdefghij" * 100)[:497] + ("abcdefghij" * 100)[500:]
+            assert cur.index() == 497
+        finally:
+            n1.stop()
+
+
+def test_insert_after_and_delete_ids():
+    """
+    Cenário de teste:
+      - insert_after(None, "ab") cria dois caracteres no início.
+      - insert_after(id de "b", "c") insere logo após "b".
+      - delete_ids remove "b" e "c"; IDs repetidos ou desconhecidos são ignorados.
+    """
+    n1 = build_node()
+    try:
+        ids = n1.insert_after(None, "ab")
+        assert n1.visible_text() == "ab"
+
+        ids += n1.insert_after(ids[1], "c")
+        assert n1.visible_text() == "abc"
+
+        unknown = PositionID("9", 42, 42)
+        n1.delete_ids([ids[1], ids[2], ids[1], unknown])
+        assert n1.visible_text() == "a"
+
+        assert n1.insert_after(unknown, "z") == []
+        assert n1.visible_text() == "a"
+    finally:
+        n1.stop()
+
+
+if __name__ == "__main__":
+    test_cursor_typing_and_remote_edits()
+    test_backspace_keeps_position_shortcut()
+    test_insert_after_and_delete_ids()
@@ -0,0 +1,40 @@
+from node import Node
+
+
+def test_columnar_replica_matches_list():
+    """
+    Cenário de teste:
+      - Um nó com a réplica em lista e outro com a réplica colunar recebem
+        exatamente as mesmas operações (inserts em vários pontos e deletes).
+    Esperado: texto visível, tombstones e snapshot idênticos nos dois layouts.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [])
+    n2 = Node("2", "127.0.0.1", 5012, [], columnar=True)
+
+    try:
+        ops = []
+        original_broadcast = n1._broadcast
+        n1._broadcast = ops.append
+
+        cur = n1.cursor()
+        cur.insert("Hello World")
+        n1.insert("!", 11)
+        n1.delete(6)
+        cur.delete_backward(2)
+
+        for op in ops:
+            n2.merge(op)
+        n1._broadcast = original_broadcast
+
+        assert n1.visible_text() == n2.visible_text() == "Hello or!"
+        assert n1.replica.tombstones() == n2.replica.tombstones() == 3
+        assert n1.replica.snapshot() == n2.replica.snapshot()
+        assert n1.replica.snapshot(2, 5) == n2.replica.snapshot(2, 5)
+        assert [c.serialize() for c in n2.replica] == n1.replica.snapshot()
+    finally:
+        n1.stop()
+        n2.stop()
+
+
+if __name__ == "__main__":
+    test_columnar_replica_matches_list()
@@ -0,0 +1,283 @@
+import base64
+import json
+import time
+import zlib
+
+from node import Node, SNAPSHOT_CHUNK, SNAPSHOT_WINDOW
+
+
+class FakeConn:
+    """
+    Socket falso que só guarda as mensagens enviadas (uma por linha).
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, payload):
+        self.sent.extend(json.loads(line) for line in payload.decode().splitlines())
+
+    def take(self):
+        msgs, self.sent = self.sent, []
+        return msgs
+
+
+def test_streaming_snapshot_window_and_resume():
+    """
+    Cenário de teste:
+      - Site 1 tem um documento de 2,5 chunks, com alguns caracteres deletados.
+      - Site 1 envia o snapshot em streaming para uma conexão falsa: só
+        SNAPSHOT_WINDOW chunks saem antes dos acks.
+      - Site 2 aplica os dois primeiros chunks e "cai"; ao reconectar, pede o
+        snapshot a partir do offset confirmado e recebe só o restante.
+    Esperado: site 2 converge para o mesmo texto e os mesmos tombstones.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [])
+    n2 = Node("2", "127.0.0.1", 5012, [])
+
+    try:
+        size = SNAPSHOT_CHUNK * 2 + SNAPSHOT_CHUNK // 2
+        n1.cursor().insert("abcdefghij" * (size // 10))
+        n1.delete_ids(n1.replica.visible_ids()[::7])
+
+        to_n2 = FakeConn()
+        to_n1 = FakeConn()
+        n2.peer_sockets["127.0.0.1:5011"] = to_n1
+
+        n1._process_incoming({"type": "sync_request", "site_id": "2", "stream": True, "offset": 0}, to_n2)
+        chunks = to_n2.take()
+        assert len(chunks) == min(3, SNAPSHOT_WINDOW)
+        assert [c["seq"] for c in chunks] == list(range(len(chunks)))
+
+        # aplica dois chunks e perde a conexão
+        for chunk in chunks[:2]:
+            n2._process_incoming(chunk, to_n1)
+        assert n2.replica.visible_count() > 0
+        offset = n2._snapshot_progress["127.0.0.1:5011"]["offset"]
+        assert offset == 2 * SNAPSHOT_CHUNK
+
+        # reconexão: novo pedido a partir do progresso salvo
+        n2._request_sync("127.0.0.1:5011", to_n1, None)
+        request = to_n1.take()[-1]
+        assert request["offset"] == offset
+        n1._process_incoming(request, to_n2)
+        rest = to_n2.take()
+        assert len(rest) == 1 and rest[0]["offset"] == offset and rest[0]["done"]
+        n2._process_incoming(rest[0], to_n1)
+
+        assert n2.visible_text() == n1.visible_text()
+        assert n2.replica.tombstones() == n1.replica.tombstones()
+        assert "127.0.0.1:5011" not in n2._snapshot_progress
+    finally:
+        n1.stop()
+        n2.stop()
+
+
+def test_resumed_snapshot_fetches_rows_inserted_before_the_offset():
+    """
+    Cenário de teste:
+      - Site 2 recebe dois chunks de um snapshot de 3 chunks e a conexão cai.
+      - Com a conexão caída, site 1 insere "NEW" perto do início (antes do offset
+        já confirmado).
+      - Site 2 retoma o snapshot do offset salvo.
+    Esperado: ao fim da parte retomada, site 2 pede um delta com o seu applied
+    em vez de se dar por pronto; com o delta, os textos e os relógios batem.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    n2 = Node("2", "127.0.0.1", 5012, [], export=False)
+    try:
+        n1.cursor().insert("abcdefghij" * (3 * SNAPSHOT_CHUNK // 10))
+        to_n2 = FakeConn()
+        to_n1 = FakeConn()
+        addr = "127.0.0.1:5011"
+        n2.peer_sockets[addr] = to_n1
+        n2.join["source"] = addr
+
+        n1._process_incoming({"type": "sync_request", "site_id": "2", "stream": True, "offset": 0}, to_n2)
+        for chunk in to_n2.take()[:2]:
+            n2._process_incoming(chunk, to_n1)
+        to_n1.take()
+
+        n1.cursor(5).insert("NEW")
+        n2._request_sync(addr, to_n1, None)
+        n1._process_incoming(to_n1.take()[-1], to_n2)
+        rest = to_n2.take()
+        assert rest[-1]["done"]
+        for chunk in rest:
+            n2._process_incoming(chunk, to_n1)
+        assert n2.join["ready_at"] is None
+        delta = [m for m in to_n1.take() if m["type"] == "sync_request"]
+        assert len(delta) == 1 and delta[0]["since"] == {"1": 3000}
+
+        n1._process_incoming(delta[0], to_n2)
+        for chunk in to_n2.take():
+            n2._process_incoming(chunk, to_n1)
+        assert n2.visible_text() == n1.visible_text()
+        assert n2.applied == n1.applied == {"1": 3003}
+        assert n2.join["ready_at"] is not None
+    finally:
+        n1.stop()
+        n2.stop()
+
+
+def test_delta_sync_chunks_only_the_delta():
+    """
+    Cenário de teste:
+      - Sites 1 e 2 compartilham um documento de 20 chunks.
+      - Site 1 faz um insert e um delete que site 2 não viu e site 2 pede o delta.
+      - Depois site 1 insere 2,5 chunks de texto e site 2 pede o delta de novo.
+    Esperado: o primeiro delta vai num único chunk (com a linha e o delete); o
+    segundo em 3 chunks cheios de linhas do delta; site 2 converge.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    n2 = Node("2", "127.0.0.1", 5012, [], export=False)
+    try:
+        ops = []
+        n1._broadcast = ops.append
+        n1.cursor().insert("abcdefghij" * (2 * SNAPSHOT_CHUNK))
+        n1.delete_ids(n1.replica.visible_ids()[::7])
+        for op in ops:
+            n2.merge(op)
+        n1.cursor(100).insert("X")
+        n1.delete(5000)
+
+        to_n2 = FakeConn()
+        to_n1 = FakeConn()
+        n2.peer_sockets["127.0.0.1:5011"] = to_n1
+        request = {"type": "sync_request", "site_id": "2", "stream": True, "since": dict(n2.applied)}
+        n1._process_incoming(request, to_n2)
+        chunks = to_n2.take()
+        assert len(chunks) == 1 and chunks[0]["done"]
+        n2._process_incoming(chunks[0], to_n1)
+        assert n2.visible_text() == n1.visible_text()
+
+        n1.cursor(0).insert("y" * (SNAPSHOT_CHUNK * 2 + SNAPSHOT_CHUNK // 2))
+        request["since"] = dict(n2.applied)
+        n1._process_incoming(request, to_n2)
+        chunks = to_n2.take()
+        assert len(chunks) == 3 and chunks[-1]["done"]
+        for chunk in chunks:
+            n2._process_incoming(chunk, to_n1)
+        assert n2.visible_text() == n1.visible_text()
+        assert n2.replica.tombstones() == n1.replica.tombstones()
+    finally:
+        n1.stop()
+        n2.stop()
+
+
+def test_delta_sync_skips_ops_applied_after_a_gap():
+    """
+    Cenário de teste:
+      - Site 2 tem "abc" de site 1; o delete seguinte de site 1 se perde e o
+        insert depois dele chega (fica além da lacuna de applied).
+      - Site 2 pede o delta a partir de applied, com e sem a lista `ahead`.
+    Esperado: sem `ahead`, o delta reenvia o insert que já chegou; com `ahead`,
+    só vai o delete perdido, e site 2 converge.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [], export=False)
+    n2 = Node("2", "127.0.0.1", 5012, [], export=False)
+    try:
+        ops = []
+        n1._broadcast = ops.append
+        n1.cursor().insert("abc")
+        n1.delete(0)
+        n1.cursor(2).insert("d")
+        for op in ops[:3] + ops[4:]:
+            n2.merge(op)
+        assert n2.applied == {"1": 3} and n2._ahead() == {"1": [5]}
+
+        to_n2 = FakeConn()
+        to_n1 = FakeConn()
+        n2.peer_sockets["127.0.0.1:5011"] = to_n1
+        request = {"type": "sync_request", "site_id": "2", "stream": True, "since": dict(n2.applied)}
+        for ahead, rows in ((None, 1), (n2._ahead(), 0)):
+            if ahead is not None:
+                request["ahead"] = ahead
+            n1._process_incoming(request, to_n2)
+            chunks = to_n2.take()
+            assert len(chunks) == 1 and chunks[0]["done"]
+            data = json.loads(zlib.decompress(base64.b64decode(chunks[0]["data"])))
+            assert len(data["rows"]) == rows and len(data["deletes"]) == 1
+        n2._process_incoming(chunks[0], to_n1)
+        assert n2.visible_text() == n1.visible_text() == "bcd"
+        assert n2.applied == {"1": 5}
+    finally:
+        n1.stop()
+        n2.stop()
+
+
+def test_streaming_snapshot_over_tcp():
+    """
+    Cenário de teste:
+      - Site 1 (sem peers) já tem um documento grande.
+      - Site 2 sobe depois, conecta em site 1 e recebe o snapshot em streaming.
+    Esperado: site 2 converge para o texto de site 1.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [])
+    n2 = None
+    try:
+        n1.cursor().insert("xyz" * SNAPSHOT_CHUNK)
+        n2 = Node("2", "127.0.0.1", 5012, [("127.0.0.1", 5011)])
+
+        deadline = time.time() + 5.0
+        while time.time() < deadline and n2.visible_text() != n1.visible_text():
+            time.sleep(0.1)
+
+        assert n2.visible_text() == n1.visible_text()
+        assert not n1._transfers
+    finally:
+        n1.stop()
+        if n2 is not None:
+            n2.stop()
+
+
+def test_bootstrap_single_snapshot_then_deltas():
+    """
+    Cenário de teste:
+      - Sites 1 e 2 já compartilham um documento grande.
+      - Site 2 tem ainda uma edição que site 1 não viu.
+      - Site 3 sobe conectando nos dois.
+    Esperado: site 3 recebe o snapshot completo de um só peer; o outro envia só
+    o delta além do relógio do snapshot, e site 3 converge para o texto de site 2.
+    """
+    n1 = Node("1", "127.0.0.1", 5011, [])
+    n2 = Node("2", "127.0.0.1", 5012, [])
+    n3 = None
+    try:
+        ops = []
+        n1._broadcast = ops.append
+        n1.cursor().insert("abc" * SNAPSHOT_CHUNK)
+        n1.delete_ids(n1.replica.visible_ids()[:10])
+        for op in ops:
+            n2.merge(op)
+        n2.cursor().insert("!")
+
+        n3 = Node("3", "127.0.0.1", 5013, [("127.0.0.1", 5011), ("127.0.0.1", 5012)])
+
+        deadline = time.time() + 8.0
+        while time.time() < deadline and n3.join["ready_at"] is None:
+            time.sleep(0.1)
+
+        assert n3.join["ready_at"] is not None
+        assert n3.visible_text() == n2.visible_text()
+        assert n3.replica.tombstones() == 10
+
+        stats = n3.join_stats()
+        assert stats["ready"] and stats["snapshot_seconds"] <= stats["seconds"]
+        source = stats["source"]
+        other = "127.0.0.1:5012" if source == "127.0.0.1:5011" else "127.0.0.1:5011"
+        assert stats["bytes"][source] > 10 * stats["bytes"][other]
+    finally:
+        n1.stop()
+        n2.stop()
+        if n3 is not None:
+            n3.stop()
+
+
+if __name__ == "__main__":
+    test_streaming_snapshot_window_and_resume()
+    test_resumed_snapshot_fetches_rows_inserted_before_the_offset()
+    test_delta_sync_chunks_only_the_delta()
+    test_delta_sync_skips_ops_applied_after_a_gap()
+    test_streaming_snapshot_over_tcp()
+    test_bootstrap_single_snapshot_then_deltas()
@@ -0,0 +1,121 @@
+import json
+import urllib.request
+
+from metrics import Metrics
+from node import Node
+from sim import SimNetwork
+from utils import PositionID
+
+
+def test_metrics_counters_and_endpoint():
+    """
+    Cenário de teste:
+      - Site 1 com métricas digita "abc" e apaga um caractere.
+      - Site 2 sem métricas faz o mesmo.
+    Esperado: site 1 conta as operações e as latências e expõe tudo por HTTP;
+    site 2 não tem nenhum método embrulhado.
+    """
+    metrics = Metrics()
+    n1 = Node("1", "127.0.0.1", 5011, [], metrics=metrics)
+    n2 = Node("2", "127.0.0.1", 5012, [])
+
+    try:
+        for node in (n1, n2):
+            node.cursor().insert("abc")
+            node.delete(0)
+
+        stats = metrics.snapshot()
+        assert stats["counters"]['ops_applied_total{type="insert"}'] == 3
+        assert stats["counters"]['ops_applied_total{type="delete"}'] == 1
+        assert stats["counters"]["ops_merged_total"] == 4
+        assert stats["histograms"]["merge_seconds"]["count"] == 4
+        assert stats["histograms"]["lock_wait_seconds"]["count"] > 0
+        assert stats["gauges"]["replica_tombstones"] == 1
+        assert stats["gauges"]["tombstone_ratio"] == 1 / 3
+
+        host, port = metrics.serve("127.0.0.1", 0)
+        text = urllib.request.urlopen(f"http://{host}:{port}/metrics").read().decode()
+        assert 'crdt_ops_applied_total{type="insert"} 3' in text
+        assert 'crdt_merge_seconds_bucket{le="+Inf"} 4' in text
+        served = json.loads(urllib.request.urlopen(f"http://{host}:{port}/stats").read())
+        assert served["counters"]["ops_merged_total"] == 4
+
+        assert "merge" in vars(n1) and "merge" not in vars(n2)
+        assert n2.metrics is None
+    finally:
+        metrics.stop()
+        n1.stop()
+        n2.stop()
+
+
+def test_applied_counts_only_real_inserts():
+    """
+    Cenário de teste:
+      - Chega o insert de um filho antes do insert do pai (fica pendente).
+      - Chega o pai, que aplica o filho pendente; depois o pai chega de novo.
+    Esperado: ops_applied_total conta 2 inserts (os 2 caracteres visíveis) e o
+    histograma de _merge_insert tem uma amostra por merge, sem a chamada aninhada.
+    """
+    metrics = Metrics()
+    n1 = Node("1", "127.0.0.1", 5011, [], metrics=metrics, export=False)
+    try:
+        parent = PositionID("2", 1, 1)
+        child = PositionID("2", 2, 2)
+        parent_op = {"type": "insert", "site_id": "2", "pos_id": None, "char": "a", "op_id": parent.serialize()}
+        child_op = {
+            "type": "insert",
+            "site_id": "2",
+            "pos_id": parent.serialize(),
+            "char": "b",
+            "op_id": child.serialize(),
+        }
+        for op in (child_op, parent_op, parent_op):
+            n1.merge(op)
+        assert n1.visible_text() == "ab"
+
+        stats = metrics.snapshot()
+        assert stats["counters"]['ops_applied_total{type="insert"}'] == 2
+        assert stats["histograms"]["merge_insert_seconds"]["count"] == 3
+    finally:
+        n1.stop()
+
+
+def test_network_bytes_labelled_by_peer_site():
+    """
+    Cenário de teste:
+      - Dois sites com métricas na rede simulada trocam edições.
+      - A rede é particionada e curada, e cada site reconecta ao outro.
+    Esperado: bytes enviados e recebidos têm uma série por site do peer
+    (peer="2" no site 1), somando as duas conexões e a reconexão, sem nenhuma
+    série rotulada por endereço.
+    """
+    net = SimNetwork(seed=3)
+    metrics = {"1": Metrics(), "2": Metrics()}
+    nodes = [
+        Node(site, "sim", 0, [], export=False, metrics=metrics[site], transport=net.transport(addr, [peer]))
+        for site, addr, peer in (("1", "sim:1", "sim:2"), ("2", "sim:2", "sim:1"))
+    ]
+    n1, n2 = nodes
+    net.run()
+    n1.cursor().insert("abc")
+    net.run()
+    net.partition(["sim:1"], ["sim:2"])
+    n2.cursor(0).insert("xy")
+    net.heal()
+    net.run()
+    assert n1.visible_text() == n2.visible_text() == "xyabc"
+
+    for site, peer in (("1", "2"), ("2", "1")):
+        counters = metrics[site].snapshot()["counters"]
+        labelled = {k for k in counters if k.startswith(("bytes_sent_total", "bytes_received_total"))}
+        assert labelled == {f'bytes_sent_total{{peer="{peer}"}}', f'bytes_received_total{{peer="{peer}"}}'}
+    assert metrics["1"].snapshot()["counters"]['peer_reconnects_total{peer="sim:2"}'] == 1
+    sent = metrics["1"].snapshot()["counters"]['bytes_sent_total{peer="2"}']
+    received = metrics["2"].snapshot()["counters"]['bytes_received_total{peer="1"}']
+    assert sent == received > 0
+
+
+if __name__ == "__main__":
+    test_metrics_counters_and_endpoint()
+    test_applied_counts_only_real_inserts()
+    test_network_bytes_labelled_by_peer_site()
@@ -0,0 +1,54 @@
+from sim import SimNetwork, build_cluster, random_workload
+
+
+def run_cluster(seed, sites=8, ops=150, **faults):
+    """
+    Roda uma carga aleatória num cluster simulado e devolve (rede, nós).
+    """
+    net = SimNetwork(seed, **faults)
+    nodes = build_cluster(net, sites)
+    net.run()
+    random_workload(net, nodes, ops, 2.0, seed)
+    return net, nodes
+
+
+def test_sim_converges_with_faults():
+    """
+    Cenário de teste:
+      - 8 sites em rede simulada com reordenação, duplicação e perda de mensagens.
+      - Uma partição separa metade dos sites durante a carga e depois é desfeita.
+    Esperado: após settle(), todos os sites têm o mesmo estado.
+    """
+    net, nodes = run_cluster(7, duplicate=0.1, loss=0.05)
+    side = [f"sim:{i}" for i in range(1, 5)]
+    net.schedule(0.5, net.partition, side)
+    net.schedule(1.5, net.heal)
+    net.run()
+    net.settle()
+
+    assert net.converged()
+    assert net.stats["dropped"] > 0 and net.stats["duplicated"] > 0
+    assert nodes[0].visible_text()
+
+
+def test_sim_is_deterministic():
+    """
+    Cenário de teste:
+      - A mesma semente roda duas vezes; uma semente diferente roda uma vez.
+    Esperado: mesma semente, mesmo estado final e mesmas estatísticas da rede.
+    """
+    results = []
+    for seed in (3, 3, 4):
+        net, nodes = run_cluster(seed, sites=5, ops=80, loss=0.02)
+        net.run()
+        net.settle()
+        assert net.converged()
+        results.append((nodes[0].state_hash(), net.stats))
+
+    assert results[0] == results[1]
+    assert results[0][0] != results[2][0]
+
+
+if __name__ == "__main__":
+    test_sim_converges_with_faults()
+    test_sim_is_deterministic()
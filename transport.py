@@ -0,0 +1,144 @@
+import json
+import socket
+import threading
+import time
+import traceback
+from typing import List, Tuple
+
+
+# Interface entre o Node e a rede. O transporte abre as conexões e entrega ao
+# Node, pelos callbacks abaixo, cada conexão nova, cada mensagem e cada queda:
+#   node._on_peer_connected(addr_str, conn)   conexão de saída para um peer
+#   node._on_message(msg, conn, addr_str, nbytes)
+#   node._on_conn_closed(conn, addr_str)
+#   node._on_bytes(conn, nbytes, sent)       bytes lidos ou escritos na conexão
+# `conn` é opaco para o Node: só é usado de volta em send().
+class Transport:
+    def start(self, node):
+        raise NotImplementedError
+
+    # Envia um frame já codificado (JSON + "\n"); levanta exceção se falhar
+    def send(self, conn, payload: bytes):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    # Relógio usado nas estatísticas do Node (o simulador usa tempo virtual)
+    def now(self) -> float:
+        return time.time()
+
+
+# Transporte real: um servidor TCP, conexões de saída para cada peer e uma
+# thread por conexão lendo mensagens separadas por "\n"
+class TcpTransport(Transport):
+    def __init__(self, host: str, port: int, peer_addrs: List[Tuple[str, int]]):
+        self.host = host
+        self.port = port
+        self.peer_addrs = peer_addrs
+        self.node = None
+        self.server_sock = None
+        self.listener_thread = None
+        self.stop_event = threading.Event()
+        # um lock de envio por socket, para que frames de threads diferentes não se misturem
+        self._send_locks = {}
+
+    def start(self, node):
+        self.node = node
+        # inicia servidor para aceitar conexões de peers
+        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_sock.bind((self.host, self.port))
+        self.server_sock.listen(5)
+        self.listener_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.listener_thread.start()
+
+        # inicia thread de conexão aos peers
+        ct = threading.Thread(target=self._connect_to_peers_loop, daemon=True)
+        ct.start()
+
+    # loop que aceita conexões de entrada
+    def _accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                client, addr = self.server_sock.accept()
+                t = threading.Thread(target=self._handle_conn, args=(client, addr), daemon=True)
+                t.start()
+            except Exception:
+                pass
+
+    # tenta conectar aos peers periodicamente
+    def _connect_to_peers_loop(self):
+        node = self.node
+        while not self.stop_event.is_set():
+            for (ph, pp) in self.peer_addrs:
+                addr_str = f"{ph}:{pp}"
+                if addr_str in node.peer_sockets:
+                    continue
+                try:
+                    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    s.settimeout(2.0)
+                    s.connect((ph, pp))
+                    s.settimeout(None)
+                    t = threading.Thread(target=self._handle_conn, args=(s, (ph, pp)), daemon=True)
+                    t.start()
+                    node._on_peer_connected(addr_str, s)
+                except Exception:
+                    time.sleep(0.1)
+            time.sleep(1.0)
+
+    # lida com as mensagens recebidas
+    def _handle_conn(self, conn: socket.socket, addr):
+        node = self.node
+        addr_str = f"{addr[0]}:{addr[1]}"
+        try:
+            buf = b""
+            while not self.stop_event.is_set():
+                data = conn.recv(4096)
+                if not data:
+                    break
+                node._on_bytes(conn, len(data), False)
+                buf += data
+                # mensagens separadas por \n
+                while b"\n" in buf:
+                    line, buf = buf.split(b"\n", 1)
+                    try:
+                        msg = json.loads(line.decode())
+                        node._on_message(msg, conn, addr_str, len(line) + 1)
+                    except Exception:
+                        traceback.print_exc()
+                        continue
+        except Exception:
+            pass
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            node._on_conn_closed(conn, addr_str)
+            self._send_locks.pop(conn, None)
+
+    def send(self, conn: socket.socket, payload: bytes):
+        send_lock = self._send_locks.get(conn)
+        if send_lock is None:
+            send_lock = self._send_locks.setdefault(conn, threading.Lock())
+        with send_lock:
+            conn.sendall(payload)
+        self.node._on_bytes(conn, len(payload), True)
+
+    def stop(self):
+        self.stop_event.set()
+        try:
+            # shutdown desbloqueia o accept() pendente e libera a porta
+            self.server_sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        try:
+            self.server_sock.close()
+        except Exception:
+            pass
+        for s in list(self.node.peer_sockets.values()):
+            try:
+                s.close()
+            except Exception:
+                pass
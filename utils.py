@@ -1,10 +1,13 @@
 import json
+import sys
 from dataclasses import dataclass
 from typing import Dict, Optional
 
 
 # Gerencia o relógio vetorial para rastreamento causal
 class VectorClock:
+    __slots__ = ("v",)
+
     def __init__(self, d: Optional[Dict[str, int]] = None):
         self.v = dict(d) if d else {}
 
@@ -53,47 +56,89 @@ class VectorClock:
 
     @staticmethod
     def deserialize(d):
-        return VectorClock.from_dict(d)
+        # nomes de site internados: as chaves de todos os relógios são o mesmo objeto
+        return VectorClock({sys.intern(s): c for s, c in (d or {}).items()})
 
 
-@dataclass(order=False)
+# Imutável e sem __dict__; comparado por identidade (a réplica guarda uma única
+# instância canônica por ID, ver Node.chars). Guarda só o que a réplica usa: o
+# site e o contador dele (identidade) e o timestamp de Lamport (ordem); o relógio
+# vetorial do nó não é copiado para cada caractere.
+@dataclass(frozen=True, eq=False)
 class PositionID:
-    vclock: VectorClock
+    __slots__ = ("site", "counter", "lamport")
     site: str
+    counter: int
+    lamport: int
 
+    # Na rede o ID mantém o formato {"vclock", "site"}, com o relógio reduzido à
+    # entrada do próprio site, mais o Lamport
     def serialize(self):
-        return {"vclock": self.vclock.serialize(), "site": self.site}
+        return {"vclock": {self.site: self.counter}, "site": self.site, "lamport": self.lamport}
 
+    # Com `known` (key -> PositionID, ex: Node.chars), devolve a instância já
+    # existente em vez de criar uma cópia. IDs sem "lamport" (relógio completo,
+    # ex: traces antigos) usam a soma do relógio, o Lamport equivalente.
     @staticmethod
-    def deserialize(d):
+    def deserialize(d, known: Optional[Dict[tuple, "PositionID"]] = None):
         if d is None:
             return None
-        return PositionID(VectorClock.deserialize(d["vclock"]), d["site"])
+        if known is not None:
+            pid = known.get(PositionID.key_of(d))
+            if pid is not None:
+                return pid
+        vclock = d["vclock"]
+        site = sys.intern(d["site"])
+        lamport = d.get("lamport")
+        if lamport is None:
+            lamport = sum(vclock.values())
+        return PositionID(site, vclock.get(site, 0), lamport)
+
+    # Chave hashable do ID: cada site numera suas operações em sequência, então
+    # (site, contador do próprio site) identifica o caractere
+    def key(self):
+        return (self.site, self.counter)
+
+    # key() calculada direto da forma serializada, sem criar o PositionID
+    @staticmethod
+    def key_of(d: dict):
+        site = d["site"]
+        return (site, d["vclock"].get(site, 0))
 
     def __repr__(self):
-        return f"PID(site={self.site},vclock={self.vclock.v})"
+        return f"PID(site={self.site},counter={self.counter},lamport={self.lamport})"
 
-    def before(self, other: "PositionID") -> bool:
-        if self.vclock.happens_before(other.vclock):
-            return True
-        if other.vclock.happens_before(self.vclock):
-            return False
-        return self.site < other.site
+    # Timestamp de Lamport desempatado pelo site: ordem total compatível com a
+    # causalidade (um filho sempre é maior que o parent)
+    def timestamp(self):
+        return (self.lamport, self.site)
 
 
-@dataclass
+# Sem __dict__: com milhões de caracteres, cada atributo por instância pesa.
+# `parent` aponta para o PositionID canônico do predecessor, não para uma cópia.
 class Char:
-    value: str
-    id: PositionID
-    parent: Optional[PositionID] = None # adicionei lógica de predecessor, para garantir
-    deleted: bool = False
+    __slots__ = ("value", "id", "parent", "deleted")
+
+    def __init__(self, value: str, id: PositionID, parent: Optional[PositionID] = None, deleted: bool = False):
+        self.value = value
+        self.id = id
+        self.parent = parent # adicionei lógica de predecessor, para garantir
+        self.deleted = deleted
+
+    def __repr__(self):
+        return f"Char(value={self.value!r}, id={self.id}, parent={self.parent}, deleted={self.deleted})"
 
     def serialize(self):
         return {"value": self.value, "id": self.id.serialize() if self.id else None, "parent": self.parent.serialize() if self.parent else None, "deleted": self.deleted}
 
     @staticmethod
-    def deserialize(d):
-        return Char(d["value"], PositionID.deserialize(d["id"]), PositionID.deserialize(d.get("parent")), d["deleted"])
+    def deserialize(d, known: Optional[Dict[tuple, PositionID]] = None):
+        return Char(
+            d["value"],
+            PositionID.deserialize(d["id"], known),
+            PositionID.deserialize(d.get("parent"), known),
+            d["deleted"],
+        )
 
 # helper: op id - codificamos a identidade da operação da mesma forma que PositionID para inserções; para exclusões, usamos o target id
 def op_id_from_position(pid: PositionID) -> str: